@@ -1,12 +1,28 @@
 import json #to create saveDataToFile and loadDataFromFile, i wanted to use json
 import random #by using random, we replicate the fluctuation of hourly weather conditions (almost accurate)
 from datetime import datetime #when saving data, we need to save data like when the file was saved. so i used datetime as well
-from collections import defaultdict #with defaultdict we write cleaner and safer code by using automatic default values ​​in the dictionary
+from collections import OrderedDict #keeps the forecast cache in least recently used order
+from collections import Counter, deque #shared trigram counts in city search, rolling window statistics
 import os #to check if file exists in the project this provides a good method
 from abc import ABC, abstractmethod #for abstract base classes
-import unittest #to test the app
+from array import array #typed arrays keep big tables of numbers compact compared to one python object per value
+import bisect #finding the latency histogram bucket of a call
+import functools #wraps keeps the names of instrumented methods
+import time #operation timing for the metrics layer
+import re #url routing in serve mode
+import threading #serve mode runs app work in executor threads, a lock keeps them from stepping on each other
+import itertools #islice lets us stop a streaming load after a given number of records
+import mmap #snapshots are mapped into memory instead of being read and parsed up front
+import struct #fixed-width binary header for the snapshot format
+import zlib #crc32 checksum of snapshot files
+import sys #snapshots check sys.byteorder, the numeric columns are written as little-endian machine arrays
+import unicodedata #accent folding for city search, so "Bogota" finds "Bogotá"
+import operator #alert rules are written as (field, operator, value) and turned into plain comparison functions
+#asyncio, concurrent.futures, csv and unittest are only imported by the modes that need them, to keep startup fast
 
 class WeatherData:
+    __slots__ = ("city", "continent", "temperature", "condition", "windSpeed", "humidity") #no per-instance __dict__
+
     def __init__(self, city, continent, temperature, condition, windSpeed, humidity):
         self.city = city
         self.continent = continent
@@ -18,7 +34,348 @@ class WeatherData:
     def __str__(self):
         return (f"{self.city} ({self.continent}) - {self.temperature}°C, {self.condition}, "
                 f"Wind: {self.windSpeed} km/h, Humidity: {self.humidity}%")
-                
+
+    @staticmethod
+    def toDict(data): #static so it also works for WeatherRow views
+        return {
+            "city": data.city,
+            "continent": data.continent,
+            "temperature": data.temperature,
+            "condition": data.condition,
+            "windSpeed": data.windSpeed,
+            "humidity": data.humidity
+        }
+
+    @staticmethod
+    def fromDict(entry):
+        return WeatherData(entry["city"], entry["continent"], entry["temperature"],
+                           entry["condition"], entry["windSpeed"], entry["humidity"])
+
+class StringPool: #interns repeated strings (continents, conditions) so a table only stores a small integer code per row
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._codes[value] = code
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+def _tableNumber(value): #columns are stored as floats, but whole numbers should still print like 22 and not 22.0
+    return int(value) if value.is_integer() else value
+
+class WeatherRow: #a WeatherData-like view over one row of a WeatherTable, nothing is copied out of the columns
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    @property
+    def city(self):
+        return self._table.cities[self._row]
+
+    @city.setter
+    def city(self, value):
+        self._table.cities[self._row] = value
+
+    @property
+    def continent(self):
+        return self._table.continents.values[self._table.continentCodes[self._row]]
+
+    @continent.setter
+    def continent(self, value):
+        self._table.continentCodes[self._row] = self._table.continents.code(value)
+
+    @property
+    def condition(self):
+        return self._table.conditions.values[self._table.conditionCodes[self._row]]
+
+    @condition.setter
+    def condition(self, value):
+        self._table.conditionCodes[self._row] = self._table.conditions.code(value)
+
+    @property
+    def temperature(self):
+        return _tableNumber(self._table.temperature[self._row])
+
+    @temperature.setter
+    def temperature(self, value):
+        self._table.temperature[self._row] = value
+
+    @property
+    def windSpeed(self):
+        return _tableNumber(self._table.windSpeed[self._row])
+
+    @windSpeed.setter
+    def windSpeed(self, value):
+        self._table.windSpeed[self._row] = value
+
+    @property
+    def humidity(self):
+        return _tableNumber(self._table.humidity[self._row])
+
+    @humidity.setter
+    def humidity(self, value):
+        self._table.humidity[self._row] = value
+
+    __str__ = WeatherData.__str__
+
+class WeatherTable: #columnar storage for large amounts of weather records (one typed array per field)
+    def __init__(self):
+        self.cities = []
+        self.temperature = array("d")
+        self.windSpeed = array("d")
+        self.humidity = array("d")
+        self.continentCodes = array("H")
+        self.conditionCodes = array("H")
+        self.continents = StringPool()
+        self.conditions = StringPool()
+
+    @classmethod
+    def fromRecords(cls, records):
+        table = cls()
+        for r in records:
+            table.append(r.city, r.continent, r.temperature, r.condition, r.windSpeed, r.humidity)
+        return table
+
+    def append(self, city, continent, temperature, condition, windSpeed, humidity):
+        self.cities.append(city)
+        self.temperature.append(temperature)
+        self.windSpeed.append(windSpeed)
+        self.humidity.append(humidity)
+        self.continentCodes.append(self.continents.code(continent))
+        self.conditionCodes.append(self.conditions.code(condition))
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.cities)
+        if not 0 <= index < len(self.cities):
+            raise IndexError("WeatherTable index out of range")
+        return WeatherRow(self, index)
+
+    def __iter__(self):
+        for row in range(len(self.cities)):
+            yield WeatherRow(self, row)
+
+    def toWeatherData(self, index):
+        row = self[index]
+        return WeatherData(row.city, row.continent, row.temperature, row.condition, row.windSpeed, row.humidity)
+
+    @property
+    def nbytes(self): #size of the numeric and code columns, city names are counted separately by the caller if needed
+        columns = (self.temperature, self.windSpeed, self.humidity, self.continentCodes, self.conditionCodes)
+        return sum(len(c) * c.itemsize for c in columns)
+
+FORECAST_CONDITIONS = ["Sunny", "Cloudy", "Rainy", "Stormy", "Snowy"]
+
+class ForecastSlice: #the forecast rows of one city inside a ForecastMatrix, behaves like the old list of WeatherData
+    __slots__ = ("table", "start", "hours")
+
+    def __init__(self, table, start, hours):
+        self.table = table
+        self.start = start
+        self.hours = hours
+
+    def __len__(self):
+        return self.hours
+
+    def __getitem__(self, hour):
+        if hour < 0:
+            hour += self.hours
+        if not 0 <= hour < self.hours:
+            raise IndexError("forecast hour out of range")
+        return WeatherRow(self.table, self.start + hour)
+
+    def __iter__(self):
+        for row in range(self.start, self.start + self.hours):
+            yield WeatherRow(self.table, row)
+
+    @property
+    def nbytes(self): #this slice's share of the matrix columns (3 doubles, 2 codes and a city reference per hour)
+        return self.hours * 36
+
+    def detached(self):
+        #the same hours in a table of their own, so holding on to this slice doesn't keep the whole matrix alive
+        if len(self.table) == self.hours:
+            return self
+        end = self.start + self.hours
+        table = WeatherTable()
+        table.continents, table.conditions = self.table.continents, self.table.conditions #small, shared
+        table.cities = self.table.cities[self.start:end]
+        for column in ("temperature", "windSpeed", "humidity", "continentCodes", "conditionCodes"):
+            setattr(table, column, getattr(self.table, column)[self.start:end])
+        return ForecastSlice(table, 0, self.hours)
+
+class ForecastCache: #bounded LRU cache of hourly forecasts keyed by city key, forecasts are generated on first access
+    def __init__(self, generate, maxEntries=10000, maxBytes=None):
+        self._generate = generate #called with a city key, returns a forecast or None when the city does not exist
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(forecast):
+        nbytes = getattr(forecast, "nbytes", None)
+        return len(forecast) * 64 if nbytes is None else nbytes #the estimate only for plain lists, which have no nbytes
+
+    def __contains__(self, city_key): #only looks, never generates
+        return city_key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def __getitem__(self, city_key):
+        forecast = self._entries.get(city_key)
+        if forecast is not None:
+            self.hits += 1
+            self._entries.move_to_end(city_key)
+            return forecast
+        self.misses += 1
+        forecast = self._generate(city_key)
+        if forecast is None:
+            raise KeyError(city_key)
+        self[city_key] = forecast
+        return self._entries.get(city_key, forecast)
+
+    def get(self, city_key, default=None):
+        try:
+            return self[city_key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, city_key, forecast):
+        if self.maxBytes is not None and hasattr(forecast, "detached"):
+            forecast = forecast.detached() #a slice of a big matrix would pin all of it, the byte budget has to mean something
+        size = self._size(forecast) #first, if it raises the cache is left as it was
+        self.pop(city_key)
+        self._entries[city_key] = forecast
+        self._sizes[city_key] = size
+        self.currentBytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._entries and ((self.maxEntries is not None and len(self._entries) > self.maxEntries) or
+                                 (self.maxBytes is not None and self.currentBytes > self.maxBytes)):
+            city_key, _ = self._entries.popitem(last=False)
+            self.currentBytes -= self._sizes.pop(city_key)
+            self.evictions += 1
+
+    def pop(self, city_key, default=None):
+        if city_key not in self._entries:
+            return default
+        self.currentBytes -= self._sizes.pop(city_key)
+        return self._entries.pop(city_key)
+
+    def __delitem__(self, city_key):
+        if city_key not in self._entries:
+            raise KeyError(city_key)
+        self.pop(city_key)
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self.currentBytes = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.currentBytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    #store observer: a forecast is derived from the base observation, so it goes stale when that changes
+    def onAdd(self, data):
+        pass
+
+    def onUpdate(self, old, new):
+        self.pop(CityStore.cityKey(old.city))
+
+    def onRemove(self, data):
+        self.pop(CityStore.cityKey(data.city))
+
+    def onClear(self):
+        self.clear()
+
+class ForecastMatrix: #hourly forecasts for many cities in one WeatherTable, 'hours' consecutive rows per city
+    def __init__(self, hours=24):
+        self.hours = hours
+        self.table = WeatherTable()
+        self.startRows = {}
+        for condition in FORECAST_CONDITIONS: #condition codes are then simply the index in FORECAST_CONDITIONS
+            self.table.conditions.code(condition)
+
+    def __len__(self):
+        return len(self.startRows)
+
+    def __contains__(self, city_key):
+        return city_key in self.startRows
+
+    def forCity(self, city_key):
+        start = self.startRows.get(city_key)
+        if start is None:
+            return None
+        return ForecastSlice(self.table, start, self.hours)
+
+    def fill(self, cities, seed, workers=None, chunk_size=None):
+        #every city gets its own random stream seeded from (seed, city key), so the result does not depend on
+        #how the cities are split into chunks or how many worker processes run them
+        hours = self.hours
+        table = self.table
+        rows = []
+        for base in cities:
+            key = CityStore.cityKey(base.city)
+            self.startRows[key] = len(table.cities)
+            table.cities.extend([base.city] * hours)
+            table.continentCodes.extend([table.continents.code(base.continent)] * hours)
+            rows.append((key, base.temperature, base.windSpeed, base.humidity))
+
+        chunk_size = chunk_size or max(1, -(-len(rows) // ((workers or 1) * 4)))
+        jobs = [(seed, hours, rows[i:i + chunk_size]) for i in range(0, len(rows), chunk_size)]
+        if workers and workers > 1:
+            import concurrent.futures
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                self._appendChunks(pool.map(_forecastChunk, jobs))
+        else:
+            self._appendChunks(map(_forecastChunk, jobs))
+
+    def _appendChunks(self, chunks): #chunks come back as raw column bytes, in job order
+        for temps, winds, humidities, conditions in chunks:
+            self.table.temperature.frombytes(temps)
+            self.table.windSpeed.frombytes(winds)
+            self.table.humidity.frombytes(humidities)
+            self.table.conditionCodes.frombytes(conditions)
+
+def _forecastChunk(job):
+    #module level so worker processes can run it, takes plain tuples and returns packed columns instead of objects
+    seed, hours, rows = job
+    temps, winds, humidities, conditions = array("d"), array("d"), array("d"), array("H")
+    condition_codes = range(len(FORECAST_CONDITIONS))
+    for key, temperature, windSpeed, humidity in rows:
+        rng = random.Random(f"{seed}:{key}") #str seeds are hashed with sha512, so this is stable across processes
+        temps.extend([temperature + v for v in rng.choices(range(-3, 4), k=hours)])
+        humidities.extend([max(0, min(100, humidity + v)) for v in rng.choices(range(-10, 11), k=hours)])
+        winds.extend([max(0, windSpeed + v) for v in rng.choices(range(-5, 6), k=hours)])
+        conditions.extend(rng.choices(condition_codes, k=hours))
+    return temps.tobytes(), winds.tobytes(), humidities.tobytes(), conditions.tobytes()
+
 class BaseWeatherAlert(ABC):
     def __init__(self, weatherData):
         self.data = weatherData
@@ -27,24 +384,45 @@ class BaseWeatherAlert(ABC):
     def check_alert(self):
         pass
 
-class SevereWeatherAlert(BaseWeatherAlert):
-    def check_alert(self):
-        if self.data.condition in ["Stormy", "Snowy"]:
-            return "⚠️ Severe weather expected"
-        return None
+class AlertRule: #a declarative threshold, e.g. AlertRule("windSpeed", ">", 30, "...") instead of a hand written if
+    OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq}
 
-class WindWarningAlert(BaseWeatherAlert):
-    def check_alert(self):
-        if self.data.windSpeed > 30:
-            return "💨 Fast winds warning"
-        return None
+    def __init__(self, field, op, value, message):
+        if op != "in" and op not in self.OPERATORS:
+            raise ValueError(f"Unknown alert rule operator '{op}'")
+        self.field = field
+        self.op = op
+        self.value = frozenset(value) if op == "in" else value
+        self.message = message
+        self.predicate = self.compile() #built once, matches runs for every alert on every city
+
+    def compile(self): #returns a one-argument predicate on the field value
+        if self.op == "in":
+            return self.value.__contains__
+        compare = self.OPERATORS[self.op]
+        threshold = self.value
+        return lambda v: compare(v, threshold)
+
+    def matches(self, data):
+        return self.predicate(getattr(data, self.field))
+
+class RuleWeatherAlert(BaseWeatherAlert): #alerts that are fully described by a rule, these can be checked in bulk
+    rule = None
 
-class HumidityAlert(BaseWeatherAlert):
     def check_alert(self):
-        if self.data.humidity > 80:
-            return "💧 Very humid"
+        if self.rule.matches(self.data):
+            return self.rule.message
         return None
 
+class SevereWeatherAlert(RuleWeatherAlert):
+    rule = AlertRule("condition", "in", ["Stormy", "Snowy"], "⚠️ Severe weather expected")
+
+class WindWarningAlert(RuleWeatherAlert):
+    rule = AlertRule("windSpeed", ">", 30, "💨 Fast winds warning")
+
+class HumidityAlert(RuleWeatherAlert):
+    rule = AlertRule("humidity", ">", 80, "💧 Very humid")
+
 class WeatherAlertHandler:
     def __init__(self):
         self.alert_types = [
@@ -62,21 +440,274 @@ class WeatherAlertHandler:
                 alerts.append(result)
         return alerts
 
+    @staticmethod
+    def _is_rule_alert(AlertClass): #subclasses that override check_alert have to go through the slow path
+        return issubclass(AlertClass, RuleWeatherAlert) and AlertClass.check_alert is RuleWeatherAlert.check_alert
+
+    def _compiled_checks(self):
+        #(bit, field, predicate, AlertClass) per alert type, predicate is None for custom alerts that need an instance
+        checks = []
+        for i, AlertClass in enumerate(self.alert_types):
+            if self._is_rule_alert(AlertClass):
+                checks.append((1 << i, AlertClass.rule.field, AlertClass.rule.predicate, AlertClass))
+            else:
+                checks.append((1 << i, None, None, AlertClass))
+        return checks
+
+    def _table_masks(self, table, checks, messages):
+        masks = array("I", bytes(4 * len(table)))
+        categorical = {"continent": (table.continentCodes, table.continents), "condition": (table.conditionCodes, table.conditions)}
+        for bit, field, predicate, AlertClass in checks:
+            if predicate is None:
+                rows = []
+                for row in range(len(table)):
+                    message = AlertClass(WeatherRow(table, row)).check_alert()
+                    if message:
+                        rows.append(row)
+                        messages[row, bit] = message
+            elif field in categorical:
+                codes, pool = categorical[field]
+                matching = {code for code, value in enumerate(pool.values) if predicate(value)} #each distinct value is tested once
+                rows = [row for row, code in enumerate(codes) if code in matching]
+            else:
+                rows = [row for row, value in enumerate(getattr(table, field)) if predicate(value)]
+            for row in rows:
+                masks[row] |= bit
+        return masks
+
+    def evaluate_masks(self, records, messages=None):
+        #one bitmask per record, bit i is set when alert_types[i] fires, WeatherTables are checked column by column
+        #messages collects {(row, bit): message} of the custom alerts, so they don't have to be checked again
+        if messages is None:
+            messages = {}
+        checks = self._compiled_checks()
+        if isinstance(records, WeatherTable):
+            return self._table_masks(records, checks, messages)
+        getters = [(bit, operator.attrgetter(field) if field else None, predicate, AlertClass)
+                   for bit, field, predicate, AlertClass in checks]
+        masks = array("I")
+        for row, data in enumerate(records):
+            mask = 0
+            for bit, getter, predicate, AlertClass in getters:
+                if predicate is not None:
+                    if predicate(getter(data)):
+                        mask |= bit
+                else:
+                    message = AlertClass(data).check_alert()
+                    if message:
+                        mask |= bit
+                        messages[row, bit] = message
+            masks.append(mask)
+        return masks
+
+    def evaluate_all(self, records):
+        #sparse result: [(weather_data, [alert messages])] only for the records that have at least one alert
+        if not isinstance(records, WeatherTable):
+            records = list(records)
+        messages = {}
+        masks = self.evaluate_masks(records, messages)
+        results = []
+        for row, mask in enumerate(masks):
+            if not mask:
+                continue
+            data = records[row]
+            alerts = []
+            for i, AlertClass in enumerate(self.alert_types):
+                if mask & (1 << i):
+                    alerts.append(messages.get((row, 1 << i)) or AlertClass.rule.message)
+            results.append((data, alerts))
+        return results
+
+class RunningStats: #min/max/mean/variance of a stream of numbers in one pass (Welford's algorithm)
+    __slots__ = ("count", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def variance(self): #population variance, like the continent report
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def stddev(self):
+        return self.variance ** 0.5
+
+class ForecastAccumulator: #online forecast statistics, can be fed hour by hour without keeping the hours around
+    FIELDS = ("temperature", "windSpeed", "humidity")
+
+    def __init__(self):
+        self.stats = {field: RunningStats() for field in self.FIELDS}
+        self.conditions = {} #condition -> hours, in first-seen order so ties go to the condition seen first
+        self.temperatureCounts = {} #temperature -> hours, forecasts use whole degrees so this stays small
+
+    @property
+    def count(self):
+        return self.stats["temperature"].count
+
+    def add(self, temperature, condition, windSpeed, humidity):
+        self.stats["temperature"].add(temperature)
+        self.stats["windSpeed"].add(windSpeed)
+        self.stats["humidity"].add(humidity)
+        self.conditions[condition] = self.conditions.get(condition, 0) + 1
+        self.temperatureCounts[temperature] = self.temperatureCounts.get(temperature, 0) + 1
+
+    def addRecord(self, data):
+        self.add(data.temperature, data.condition, data.windSpeed, data.humidity)
+
+    def addColumns(self, temperatures, conditions, windSpeeds, humidities):
+        for values in zip(temperatures, conditions, windSpeeds, humidities):
+            self.add(*values)
+
+    def dominantCondition(self):
+        return max(self.conditions, key=self.conditions.get)
+
+    def percentile(self, p, field="temperature"): #nearest-rank percentile, p between 0 and 100
+        if field != "temperature":
+            raise ValueError("Percentiles are only tracked for temperature")
+        if not self.count:
+            raise ValueError("No forecast hours to compute a percentile from")
+        rank = max(1, -(-p * self.count // 100))
+        seen = 0
+        for value in sorted(self.temperatureCounts):
+            seen += self.temperatureCounts[value]
+            if seen >= rank:
+                return value
+        return value
+
+class RollingWindowStats: #mean/min/max/variance of the last 'window' values, O(1) amortized per value
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self._values = deque()
+        self._maxes = deque() #(index, value) with decreasing values, the front is the window maximum
+        self._mins = deque()
+        self._index = 0
+        self._sum = 0.0
+        self._squares = 0.0
+
+    def add(self, value):
+        self._values.append(value)
+        self._sum += value
+        self._squares += value * value
+        while self._maxes and self._maxes[-1][1] <= value:
+            self._maxes.pop()
+        self._maxes.append((self._index, value))
+        while self._mins and self._mins[-1][1] >= value:
+            self._mins.pop()
+        self._mins.append((self._index, value))
+        if len(self._values) > self.window:
+            old = self._values.popleft()
+            self._sum -= old
+            self._squares -= old * old
+        first = self._index - len(self._values) + 1
+        if self._maxes[0][0] < first:
+            self._maxes.popleft()
+        if self._mins[0][0] < first:
+            self._mins.popleft()
+        self._index += 1
+
+    @property
+    def mean(self):
+        return self._sum / len(self._values)
+
+    @property
+    def variance(self):
+        mean = self.mean
+        return max(0.0, self._squares / len(self._values) - mean * mean)
+
+    @property
+    def min(self):
+        return self._mins[0][1]
+
+    @property
+    def max(self):
+        return self._maxes[0][1]
+
+def _plainNumber(value): #columns hold floats, but a whole number should come out like 22 and not 22.0
+    return _tableNumber(value) if isinstance(value, float) else value
+
 class ForecastAnalyzer:
     def __init__(self, forecastList):
         self.forecastList = forecastList
+        self._summary = None
+
+    @classmethod
+    def fromAccumulator(cls, accumulator): #for statistics that were streamed in hour by hour
+        analyzer = cls([])
+        analyzer._summary = accumulator
+        return analyzer
+
+    @classmethod
+    def fromColumns(cls, temperature, condition, windSpeed, humidity): #e.g. a range of observation history
+        analyzer = cls([])
+        analyzer._columnData = (temperature, condition, windSpeed, humidity)
+        return analyzer
+
+    def _columns(self): #(temperature, condition, windSpeed, humidity) columns without building a record per hour
+        if getattr(self, "_columnData", None) is not None:
+            return self._columnData
+        forecasts = self.forecastList
+        if isinstance(forecasts, ForecastSlice):
+            table, start, stop = forecasts.table, forecasts.start, forecasts.start + forecasts.hours
+            names = table.conditions.values
+            return (table.temperature[start:stop], [names[c] for c in table.conditionCodes[start:stop]],
+                    table.windSpeed[start:stop], table.humidity[start:stop])
+        return ([f.temperature for f in forecasts], [f.condition for f in forecasts],
+                [f.windSpeed for f in forecasts], [f.humidity for f in forecasts])
+
+    def summary(self): #every statistic is computed in the same single pass and then reused
+        if self._summary is None:
+            accumulator = ForecastAccumulator()
+            accumulator.addColumns(*self._columns())
+            self._summary = accumulator
+        if not self._summary.count:
+            raise ValueError("No forecast hours to analyze")
+        return self._summary
 
     def getMaxTemperature(self):
-        return max(f.temperature for f in self.forecastList)
+        return _plainNumber(self.summary().stats["temperature"].max)
 
     def getMinTemperature(self):
-        return min(f.temperature for f in self.forecastList)
+        return _plainNumber(self.summary().stats["temperature"].min)
+
+    def getMeanTemperature(self):
+        return self.summary().stats["temperature"].mean
+
+    def getTemperatureStddev(self):
+        return self.summary().stats["temperature"].stddev
+
+    def getTemperaturePercentile(self, p):
+        return _plainNumber(self.summary().percentile(p))
 
     def getDominantCondition(self):
-        conditions = defaultdict(int)
-        for f in self.forecastList:
-            conditions[f.condition] += 1
-        return max(conditions, key=conditions.get)
+        return self.summary().dominantCondition()
+
+    def rollingStats(self, window, field="temperature"):
+        #(mean, min, max) arrays for every hour over the trailing window, e.g. window=24 on a 14 day forecast
+        columns = dict(zip(("temperature", "condition", "windSpeed", "humidity"), self._columns()))
+        rolling = RollingWindowStats(window)
+        means, mins, maxes = array("d"), array("d"), array("d")
+        for value in columns[field]:
+            rolling.add(value)
+            means.append(rolling.mean)
+            mins.append(rolling.min)
+            maxes.append(rolling.max)
+        return means, mins, maxes
 
     def printForecastAnalysis(self):
         print("\n🔍 Forecast Summary:") #i thought it would look nicer to use emojis and ascii art to enhance the
@@ -85,6 +716,225 @@ class ForecastAnalyzer:
         print(f"   📉 Min Temp: {self.getMinTemperature()}°C")
         print(f"   ☁️ Most Likely Weather: {self.getDominantCondition()}")
 
+HISTORY_FIELDS = ("temperature", "windSpeed", "humidity")
+
+class HistoryRollup: #min/mean/max of the observations of one hour or one day
+    __slots__ = ("start", "count", "mins", "sums", "maxs")
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.mins = [float("inf")] * len(HISTORY_FIELDS)
+        self.sums = [0.0] * len(HISTORY_FIELDS)
+        self.maxs = [float("-inf")] * len(HISTORY_FIELDS)
+
+    def addSample(self, values):
+        self.count += 1
+        for i, value in enumerate(values):
+            self.sums[i] += value
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+
+    def merge(self, other):
+        self.count += other.count
+        for i in range(len(HISTORY_FIELDS)):
+            self.sums[i] += other.sums[i]
+            self.mins[i] = min(self.mins[i], other.mins[i])
+            self.maxs[i] = max(self.maxs[i], other.maxs[i])
+
+    def min(self, field):
+        return self.mins[HISTORY_FIELDS.index(field)]
+
+    def mean(self, field):
+        return self.sums[HISTORY_FIELDS.index(field)] / self.count if self.count else 0.0
+
+    def max(self, field):
+        return self.maxs[HISTORY_FIELDS.index(field)]
+
+class RollupRing: #closed rollups in typed columns used as a ring, like the raw observations, instead of an object each
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.starts = array("d")
+        self.counts = array("d")
+        self.mins = [array("d") for _ in HISTORY_FIELDS]
+        self.sums = [array("d") for _ in HISTORY_FIELDS]
+        self.maxs = [array("d") for _ in HISTORY_FIELDS]
+        self._start = 0 #position of the oldest rollup once the ring is full
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _columns(self):
+        return [self.starts, self.counts, *self.mins, *self.sums, *self.maxs]
+
+    def append(self, rollup):
+        if self.capacity <= 0:
+            return
+        values = [rollup.start, rollup.count, *rollup.mins, *rollup.sums, *rollup.maxs]
+        if len(self.starts) < self.capacity:
+            for column, value in zip(self._columns(), values):
+                column.append(value)
+            return
+        i = self._start
+        for column, value in zip(self._columns(), values):
+            column[i] = value
+        self._start = (i + 1) % self.capacity
+
+    def __getitem__(self, logical): #oldest first, -1 is the newest
+        count = len(self.starts)
+        if logical < 0:
+            logical += count
+        if not 0 <= logical < count:
+            raise IndexError("rollup index out of range")
+        i = (self._start + logical) % count
+        rollup = HistoryRollup(self.starts[i])
+        rollup.count = int(self.counts[i])
+        rollup.mins = [column[i] for column in self.mins]
+        rollup.sums = [column[i] for column in self.sums]
+        rollup.maxs = [column[i] for column in self.maxs]
+        return rollup
+
+    def __iter__(self):
+        for logical in range(len(self.starts)):
+            yield self[logical]
+
+class HistoryRange: #columns of the raw observations between two timestamps
+    def __init__(self, timestamps, temperature, condition, windSpeed, humidity):
+        self.timestamps = timestamps
+        self.temperature = temperature
+        self.condition = condition
+        self.windSpeed = windSpeed
+        self.humidity = humidity
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def analyzer(self):
+        return ForecastAnalyzer.fromColumns(self.temperature, self.condition, self.windSpeed, self.humidity)
+
+class CityHistory: #fixed-capacity ring buffer of observations, what falls out of it is rolled up into hours and days
+    HOUR = 3600
+    DAY = 86400
+
+    def __init__(self, conditions, capacity=256, hourlyCapacity=24 * 14, dailyCapacity=365):
+        self.conditions = conditions #StringPool shared by all cities
+        self.capacity = capacity
+        self.timestamps = array("d") #the arrays grow up to capacity and are then reused as a ring
+        self.columns = [array("d") for _ in HISTORY_FIELDS]
+        self.conditionCodes = array("H")
+        self._start = 0 #position of the oldest observation once the ring is full
+        self.hourly = RollupRing(hourlyCapacity)
+        self.daily = RollupRing(dailyCapacity)
+        self._openHour = None
+        self._openDay = None
+        self._latest = float("-inf")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def record(self, timestamp, values, condition):
+        #query and the rollups rely on time order, a clock that steps back records at the latest time seen instead
+        timestamp = self._latest = max(timestamp, self._latest)
+        code = self.conditions.code(condition)
+        if len(self.timestamps) < self.capacity:
+            self.timestamps.append(timestamp)
+            for column, value in zip(self.columns, values):
+                column.append(value)
+            self.conditionCodes.append(code)
+            return
+        i = self._start
+        self._rollUp(self.timestamps[i], [column[i] for column in self.columns])
+        self.timestamps[i] = timestamp
+        for column, value in zip(self.columns, values):
+            column[i] = value
+        self.conditionCodes[i] = code
+        self._start = (i + 1) % self.capacity
+
+    def _rollUp(self, timestamp, values):
+        hour = timestamp - timestamp % self.HOUR
+        if self._openHour is None or self._openHour.start != hour:
+            self._closeHour()
+            self._openHour = HistoryRollup(hour)
+        self._openHour.addSample(values)
+
+    def _closeHour(self):
+        if self._openHour is None:
+            return
+        hour = self._openHour
+        self.hourly.append(hour)
+        day = hour.start - hour.start % self.DAY
+        if self._openDay is None or self._openDay.start != day:
+            if self._openDay is not None:
+                self.daily.append(self._openDay)
+            self._openDay = HistoryRollup(day)
+        self._openDay.merge(hour)
+        self._openHour = None
+
+    def rollups(self, resolution="hourly", start=None, end=None):
+        #closed buckets plus the one still being filled, oldest first
+        if resolution == "hourly":
+            buckets = list(self.hourly) + ([self._openHour] if self._openHour else [])
+        elif resolution == "daily":
+            buckets = list(self.daily) + ([self._openDay] if self._openDay else [])
+            if self._openHour: #the open hour is not in the open day yet
+                partial = HistoryRollup(self._openHour.start - self._openHour.start % self.DAY)
+                if buckets and buckets[-1].start == partial.start:
+                    partial.merge(buckets.pop())
+                partial.merge(self._openHour)
+                buckets.append(partial)
+        else:
+            raise ValueError("resolution must be 'hourly' or 'daily'")
+        return [b for b in buckets if (start is None or b.start >= start) and (end is None or b.start <= end)]
+
+    def query(self, start=None, end=None):
+        #raw observations with start <= timestamp <= end, found by binary search on the time ordered ring
+        count = len(self.timestamps)
+        position = lambda logical: (self._start + logical) % count
+        timestamp_at = lambda logical: self.timestamps[position(logical)]
+        low = 0 if start is None else bisect.bisect_left(range(count), start, key=timestamp_at)
+        high = count if end is None else bisect.bisect_right(range(count), end, key=timestamp_at)
+        rows = [position(logical) for logical in range(low, high)]
+        names = self.conditions.values
+        return HistoryRange(array("d", (self.timestamps[r] for r in rows)),
+                            array("d", (self.columns[0][r] for r in rows)),
+                            [names[self.conditionCodes[r]] for r in rows],
+                            array("d", (self.columns[1][r] for r in rows)),
+                            array("d", (self.columns[2][r] for r in rows)))
+
+class ObservationHistory: #store observer that records every new or changed observation per city
+    def __init__(self, capacity=256, hourlyCapacity=24 * 14, dailyCapacity=365, clock=time.time):
+        self.capacity = capacity
+        self.hourlyCapacity = hourlyCapacity
+        self.dailyCapacity = dailyCapacity
+        self.clock = clock
+        self.conditions = StringPool()
+        self.cities = {}
+
+    def get(self, city):
+        return self.cities.get(CityStore.cityKey(city))
+
+    def record(self, data, timestamp=None):
+        key = CityStore.cityKey(data.city)
+        history = self.cities.get(key)
+        if history is None:
+            history = self.cities[key] = CityHistory(self.conditions, self.capacity, self.hourlyCapacity, self.dailyCapacity)
+        history.record(self.clock() if timestamp is None else timestamp,
+                       [getattr(data, field) for field in HISTORY_FIELDS], data.condition)
+
+    def onAdd(self, data):
+        self.record(data)
+
+    def onUpdate(self, old, new):
+        self.record(new)
+
+    def onRemove(self, data):
+        self.cities.pop(CityStore.cityKey(data.city), None)
+
+    def onClear(self):
+        self.cities.clear()
+
 class WeatherTermMeanings:
     @staticmethod
     def getMeanings(): #this part is mainly from wikipedia since i am not good at giving this much detailed information
@@ -129,12 +979,745 @@ class WeatherTermMeanings:
             else:
                 print("Invalid option. Try again.")
 
-class WeatherApp:
+class ContinentStats: #running count, sum and sum of squares of one continent, enough for mean/variance without the cities
+    FIELDS = ("temperature", "humidity", "windSpeed")
+
+    def __init__(self):
+        self.count = 0
+        self.sums = dict.fromkeys(self.FIELDS, 0)
+        self.squares = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, data, sign=1):
+        self.count += sign
+        for field in self.FIELDS:
+            value = getattr(data, field)
+            self.sums[field] += sign * value
+            self.squares[field] += sign * value * value
+
+    def remove(self, data):
+        self.add(data, -1)
+
+    def mean(self, field):
+        return self.sums[field] / self.count if self.count else 0
+
+    def variance(self, field): #population variance, clamped because float sums can drift a hair below zero
+        if not self.count:
+            return 0
+        mean = self.mean(field)
+        return max(0, self.squares[field] / self.count - mean * mean)
+
+    def stddev(self, field):
+        return self.variance(field) ** 0.5
+
+class ContinentAggregates: #store observer that keeps a ContinentStats per continent in sync with every change
+    def __init__(self):
+        self.continents = {}
+
+    @classmethod
+    def fromRecords(cls, records): #full recompute, used to double check the incremental numbers
+        aggregates = cls()
+        for data in records:
+            aggregates.onAdd(data)
+        return aggregates
+
+    def onAdd(self, data):
+        stats = self.continents.get(data.continent)
+        if stats is None:
+            stats = self.continents[data.continent] = ContinentStats()
+        stats.add(data)
+
+    def onRemove(self, data):
+        stats = self.continents[data.continent]
+        stats.remove(data)
+        if stats.count == 0:
+            del self.continents[data.continent]
+
+    def onUpdate(self, old, new):
+        self.onRemove(old)
+        self.onAdd(new)
+
+    def onClear(self):
+        self.continents.clear()
+
+class SortedFieldIndex: #(value, city key) pairs kept sorted, for top-k and range lookups in O(log N + k)
+    def __init__(self, entries=()):
+        self._entries = sorted(entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def insert(self, value, key):
+        bisect.insort(self._entries, (value, key))
+
+    def remove(self, value, key):
+        i = bisect.bisect_left(self._entries, (value, key))
+        if i < len(self._entries) and self._entries[i] == (value, key):
+            del self._entries[i]
+
+    def top(self, k, largest=True):
+        if k <= 0:
+            return []
+        if largest:
+            return [key for _, key in reversed(self._entries[-k:])]
+        return [key for _, key in self._entries[:k]]
+
+    def range(self, low=None, high=None): #low <= value <= high, None means unbounded
+        start = 0 if low is None else bisect.bisect_left(self._entries, low, key=operator.itemgetter(0))
+        stop = len(self._entries) if high is None else bisect.bisect_right(self._entries, high, key=operator.itemgetter(0))
+        return [key for _, key in self._entries[start:stop]]
+
+class CityIndexes: #store observer with a SortedFieldIndex per numeric field, for all cities and per continent
+    FIELDS = ("temperature", "windSpeed", "humidity")
+
+    def __init__(self, records=()):
+        self.all = {}
+        self.byContinent = {}
+        self.stale = False #set by a clear, the app then builds new indexes on the next query instead of N inserts on reload
+        grouped = {}
+        for data in records:
+            grouped.setdefault(data.continent, []).append(data)
+        for field in self.FIELDS: #built with one sort per index instead of N inserts
+            self.all[field] = SortedFieldIndex((getattr(d, field), CityStore.cityKey(d.city))
+                                               for cities in grouped.values() for d in cities)
+        for continent, cities in grouped.items():
+            self.byContinent[continent] = {field: SortedFieldIndex((getattr(d, field), CityStore.cityKey(d.city)) for d in cities)
+                                           for field in self.FIELDS}
+
+    def index(self, field, continent=None):
+        if field not in self.FIELDS:
+            raise ValueError(f"No index on '{field}', indexed fields are {', '.join(self.FIELDS)}")
+        if continent is None:
+            return self.all[field]
+        indexes = self.byContinent.get(continent)
+        return indexes[field] if indexes else SortedFieldIndex()
+
+    def onAdd(self, data):
+        if self.stale:
+            return
+        key = CityStore.cityKey(data.city)
+        continent = self.byContinent.get(data.continent)
+        if continent is None:
+            continent = self.byContinent[data.continent] = {field: SortedFieldIndex() for field in self.FIELDS}
+        for field in self.FIELDS:
+            value = getattr(data, field)
+            self.all[field].insert(value, key)
+            continent[field].insert(value, key)
+
+    def onRemove(self, data):
+        if self.stale:
+            return
+        key = CityStore.cityKey(data.city)
+        continent = self.byContinent[data.continent]
+        for field in self.FIELDS:
+            value = getattr(data, field)
+            self.all[field].remove(value, key)
+            continent[field].remove(value, key)
+        if not len(continent[self.FIELDS[0]]):
+            del self.byContinent[data.continent]
+
+    def onUpdate(self, old, new):
+        self.onRemove(old)
+        self.onAdd(new)
+
+    def onClear(self):
+        self.all = {field: SortedFieldIndex() for field in self.FIELDS}
+        self.byContinent = {}
+        self.stale = True
+
+def foldName(name): #casefolded, accents stripped and whitespace collapsed, "  São  Paulo" -> "sao paulo"
+    if name.isascii(): #most names, nothing to strip
+        return " ".join(name.casefold().split())
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+def editDistance(a, b, limit=None): #levenshtein distance, gives up early (returns limit + 1) once it is over limit
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is None:
+        limit = len(a)
+    if len(a) - len(b) > limit:
+        return limit + 1
+    over = limit + 1 #cells further than limit from the diagonal can't come back under it, so only the band is filled
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [i if i <= limit else over] + [over] * len(b)
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        for j in range(low, high + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]), over)
+        if min(current[low - 1:high + 1]) > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+class CitySearchIndex: #store observer for prefix autocomplete and typo tolerant lookups on folded city names
+    GRAM = 3
+    MAX_CANDIDATES = 200 #names with the most shared trigrams that get an exact edit distance
+    SUGGEST_BUILD_LIMIT = 20000 #"did you mean" builds the trigram part only up to this many names, about half a second
+
+    def __init__(self, records=()):
+        self.reset()
+        entries = []
+        for data in records:
+            key, folded = self._register(data)
+            entries.append((folded, key))
+        self._sorted = sorted(entries)
+        self.stale = False #set by a clear, the app then builds a new index on the next lookup instead of N inserts on reload
+
+    def reset(self):
+        self._folded = {} #city key -> folded name
+        self._byFolded = {} #folded name -> city keys ("Bogota" and "Bogotá" fold to the same name)
+        self._sorted = [] #(folded name, city key) for prefix search with bisect
+        self._grams = None #(trigram, name length) -> set of city keys, built by the first fuzzy search (the slow part)
+
+    @property
+    def fuzzyReady(self):
+        return self._grams is not None
+
+    def buildFuzzy(self):
+        if self._grams is None:
+            self._grams = {}
+            for key, folded in self._folded.items():
+                self._addGrams(key, folded)
+
+    @classmethod
+    def _trigrams(cls, folded):
+        padded = f"  {folded} "
+        return {padded[i:i + cls.GRAM] for i in range(len(padded) - cls.GRAM + 1)}
+
+    def _register(self, data):
+        key = CityStore.cityKey(data.city)
+        folded = foldName(data.city)
+        self._folded[key] = folded
+        self._byFolded.setdefault(folded, []).append(key)
+        return key, folded
+
+    def _addGrams(self, key, folded):
+        for gram in self._trigrams(folded):
+            postings = self._grams.get((gram, len(folded)))
+            if postings is None:
+                postings = self._grams[gram, len(folded)] = set()
+            postings.add(key)
+
+    def onAdd(self, data):
+        if self.stale:
+            return
+        key, folded = self._register(data)
+        bisect.insort(self._sorted, (folded, key))
+        if self._grams is not None:
+            self._addGrams(key, folded)
+
+    def onRemove(self, data):
+        if self.stale:
+            return
+        key = CityStore.cityKey(data.city)
+        folded = self._folded.pop(key, None)
+        if folded is None:
+            return
+        keys = self._byFolded[folded]
+        keys.remove(key)
+        if not keys:
+            del self._byFolded[folded]
+        for gram in self._trigrams(folded) if self._grams is not None else ():
+            postings = self._grams[gram, len(folded)]
+            postings.discard(key)
+            if not postings:
+                del self._grams[gram, len(folded)]
+        i = bisect.bisect_left(self._sorted, (folded, key))
+        if i < len(self._sorted) and self._sorted[i] == (folded, key):
+            del self._sorted[i]
+
+    def onUpdate(self, old, new):
+        pass #the name never changes on update
+
+    def onClear(self):
+        self.reset()
+        self.stale = True
+
+    def exact(self, query):
+        return list(self._byFolded.get(foldName(query), ()))
+
+    def prefix(self, query, limit=10):
+        folded = foldName(query)
+        i = bisect.bisect_left(self._sorted, (folded,))
+        keys = []
+        while i < len(self._sorted) and len(keys) < limit and self._sorted[i][0].startswith(folded):
+            keys.append(self._sorted[i][1])
+            i += 1
+        return keys
+
+    def fuzzy(self, query, limit=5, maxDistance=None):
+        #closest names by edit distance (ties by name), like a spell checker the 2 typo search only runs when
+        #nothing is 1 typo away, that's the expensive one on a big index
+        self.buildFuzzy()
+        folded = foldName(query)
+        if maxDistance is None:
+            maxDistance = 1 if len(folded) <= 5 else 2 #typos per name people actually make
+        ranked = [(0, folded, key) for key in self._byFolded.get(folded, ())] if maxDistance == 0 else []
+        for distance in range(1, maxDistance + 1):
+            ranked = self._within(folded, distance)
+            if ranked:
+                break
+        ranked.sort()
+        return [(key, distance) for distance, _, key in ranked[:limit]]
+
+    def _within(self, folded, maxDistance): #(distance, name, key) for every name at most maxDistance edits away
+        queryGrams = self._trigrams(folded)
+        #one edit breaks at most 3 trigrams, so a name within reach shares at least `needed` of them, and has to be in
+        #the postings of one of the rarest len(queryGrams) - needed + 1. only those are read in full, the common
+        #trigrams are just intersected with the names found so far
+        needed = len(queryGrams) - self.GRAM * maxDistance
+        ranked = []
+        for length in range(max(1, len(folded) - maxDistance), len(folded) + maxDistance + 1):
+            postings = sorted((self._grams.get((gram, length), set()) for gram in queryGrams), key=len)
+            if needed > 0:
+                rare = len(postings) - needed + 1
+                shared = Counter(itertools.chain.from_iterable(postings[:rare])) #counted in C, no per-name loop
+                for common in postings[rare:]:
+                    shared.update(common.intersection(shared))
+                candidates = [key for key, count in shared.items() if count >= needed]
+            else: #short query, every name could be a match, take the ones sharing the most trigrams
+                shared = Counter(itertools.chain.from_iterable(postings))
+                candidates = [key for key, _ in shared.most_common(self.MAX_CANDIDATES)]
+            for key in candidates:
+                name = self._folded[key]
+                distance = editDistance(folded, name, maxDistance)
+                if distance <= maxDistance:
+                    ranked.append((distance, name, key))
+        return ranked
+
+class StoreSnapshot: #the store at one moment, readers iterate it while writers carry on with the live store
+    __slots__ = ("version", "_chunks", "_count", "_records", "_byKey")
+
+    def __init__(self, version, chunks, count):
+        self.version = version
+        self._chunks = chunks #the store's chunk lists, writers copy a chunk before changing it once it is in here
+        self._count = count
+        self._records = None #tuple and key map are only built if a reader asks for them, outside the store lock
+        self._byKey = None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            for data in chunk:
+                if data is not None: #deleted slot
+                    yield data
+
+    def __getitem__(self, index):
+        if self._records is None:
+            self._records = tuple(self)
+        return self._records[index]
+
+    def _keyed(self):
+        if self._byKey is None:
+            self._byKey = {CityStore.cityKey(data.city): data for data in self}
+        return self._byKey
+
+    def __contains__(self, city):
+        return CityStore.cityKey(city) in self._keyed()
+
+    def get(self, city):
+        return self._keyed().get(CityStore.cityKey(city))
+
+    def keys(self):
+        return self._keyed().keys()
+
+class CityStore: #cities are kept in a dict keyed by the casefolded name, so add/lookup/delete don't scan the whole list
+    CHUNK = 1024 #records per copy-on-write chunk
+
     def __init__(self):
-        self.weatherDataList = []
-        self.hourlyForecasts = {}
+        self._cities = {} #casefolded name -> record, for lookups
+        self.observers = [] #objects with onAdd/onRemove/onUpdate/onClear that follow every change (aggregates etc.)
+        #writers take the lock for one change plus its observer calls, so other threads never see a city or the
+        #aggregates half way. records are replaced and never changed, readers work on a snapshot without the lock
+        self.lock = threading.RLock()
+        self.version = 0
+        self._snapshot = None #shared by every reader until the next change
+        self._reset()
+
+    def _reset(self):
+        #records also sit in insertion order in fixed size chunks (deleted ones leave a None). a snapshot is just the
+        #tuple of chunks, a writer copies the one chunk it touches if a snapshot holds it, so neither side copies it all
+        self._chunks = []
+        self._slots = {} #casefolded name -> position in the chunks
+        self._end = 0 #next free position
+        self._holes = 0
+        self._clock = 0
+        self._copiedAt = [] #clock value when each chunk was last copied, older than _sharedAt means a snapshot holds it
+        self._sharedAt = 0
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _ownChunk(self, i):
+        if self._copiedAt[i] <= self._sharedAt:
+            self._chunks[i] = list(self._chunks[i])
+            self._copiedAt[i] = self._tick()
+        return self._chunks[i]
+
+    def _append(self, key, data):
+        i, offset = divmod(self._end, self.CHUNK)
+        if offset == 0:
+            self._chunks.append([])
+            self._copiedAt.append(self._tick())
+        self._ownChunk(i).append(data)
+        self._slots[key] = self._end
+        self._end += 1
+
+    def _setSlot(self, key, data):
+        i, offset = divmod(self._slots[key], self.CHUNK)
+        self._ownChunk(i)[offset] = data
+
+    def _compact(self):
+        #too many deleted slots, lay the live records out again (old chunks stay valid for the snapshots holding them)
+        records = list(self._cities.items())
+        self._chunks, self._copiedAt, self._slots, self._end, self._holes = [], [], {}, 0, 0
+        for key, data in records:
+            self._append(key, data)
+
+    def addObserver(self, observer):
+        with self.lock:
+            self.observers.append(observer)
+
+    def removeObserver(self, observer):
+        with self.lock:
+            self.observers = [o for o in self.observers if o is not observer]
+
+    @staticmethod
+    def cityKey(city):
+        return city.casefold()
+
+    def _changed(self):
+        self.version += 1
+        self._snapshot = None
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self.lock: #only copies the list of chunks, not the records
+                if self._snapshot is None:
+                    self._sharedAt = self._tick()
+                    self._snapshot = StoreSnapshot(self.version, tuple(self._chunks), len(self._cities))
+                snapshot = self._snapshot
+        return snapshot
+
+    def __len__(self):
+        return len(self._cities)
+
+    def __iter__(self): #iterating the live dict from one thread while another adds a city would blow up
+        return iter(self.snapshot())
+
+    def __contains__(self, city):
+        return self.cityKey(city) in self._cities
+
+    def __getitem__(self, index): #positional access is only for listing/tests
+        return self.snapshot()[index]
+
+    def get(self, city):
+        return self._cities.get(self.cityKey(city))
+
+    def add(self, data):
+        key = self.cityKey(data.city)
+        with self.lock:
+            if key in self._cities:
+                return False
+            self._cities[key] = data
+            self._append(key, data)
+            self._changed()
+            for observer in self.observers:
+                observer.onAdd(data)
+        return True
+
+    def update(self, city, **changes):
+        #records are replaced instead of changed in place, so observers get both the old and the new values
+        #and a reader holding the old record never sees it change
+        key = self.cityKey(city)
+        with self.lock: #read, merge and replace in one go, two threads updating one city can't lose a change
+            old = self._cities.get(key)
+            if old is None:
+                return None
+            values = {field: getattr(old, field) for field in WeatherData.__slots__}
+            values.update(changes)
+            new = WeatherData(**values)
+            self._cities[key] = new
+            self._setSlot(key, new)
+            self._changed()
+            for observer in self.observers:
+                observer.onUpdate(old, new)
+        return new
+
+    def seed(self, records):
+        #trusted, already validated and unique records (the shared defaults), cities already in the store are kept as they are
+        with self.lock:
+            added = []
+            for data in records:
+                key = self.cityKey(data.city)
+                if key in self._cities:
+                    continue
+                self._cities[key] = data
+                self._append(key, data)
+                added.append(data)
+            if added:
+                self._changed()
+                for observer in self.observers:
+                    for data in added:
+                        observer.onAdd(data)
+        return len(added)
+
+    def delete(self, city):
+        key = self.cityKey(city)
+        with self.lock:
+            data = self._cities.pop(key, None)
+            if data is not None:
+                self._setSlot(key, None)
+                del self._slots[key]
+                self._holes += 1
+                if self._holes > max(self.CHUNK, len(self._cities)):
+                    self._compact()
+                self._changed()
+                for observer in self.observers:
+                    observer.onRemove(data)
+        return data
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def clear(self):
+        with self.lock:
+            self._cities.clear()
+            self._reset()
+            self._changed()
+            for observer in self.observers:
+                observer.onClear()
+
+class OperationMetrics: #call counts, latency histograms and processed record counts for every instrumented app operation
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10) #seconds, like a prometheus histogram
+
+    def __init__(self, profile=False, profileHook=None):
+        self.operations = {}
+        self.profile = profile or profileHook is not None
+        self.profileHook = profileHook #called as profileHook(operation, profile) after every profiled call
+        self.profiles = {} #operation -> cProfile.Profile collecting all of its calls, when no hook is given
+        self._depth = 0 #only the outermost operation is profiled, e.g. loadDataFromFile and not every add inside it
+
+    def _operation(self, name):
+        op = self.operations.get(name)
+        if op is None:
+            op = self.operations[name] = {"calls": 0, "errors": 0, "seconds": 0.0, "records": 0,
+                                          "buckets": [0] * len(self.BUCKETS)}
+        return op
+
+    def observe(self, name, seconds, records=1, error=False):
+        op = self._operation(name)
+        op["calls"] += 1
+        op["errors"] += error
+        op["seconds"] += seconds
+        op["records"] += records
+        i = bisect.bisect_left(self.BUCKETS, seconds)
+        if i < len(self.BUCKETS):
+            op["buckets"][i] += 1
+
+    def call(self, name, records, method, app, args, kwargs):
+        profiler = None
+        if self.profile and self._depth == 0:
+            import cProfile
+            profiler = cProfile.Profile() if self.profileHook else self.profiles.setdefault(name, cProfile.Profile())
+            profiler.enable()
+        self._depth += 1
+        start = time.perf_counter()
+        error = True
+        try:
+            result = method(app, *args, **kwargs)
+            error = False
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            self._depth -= 1
+            if profiler is not None:
+                profiler.disable()
+                if self.profileHook:
+                    self.profileHook(name, profiler)
+            self.observe(name, seconds, 0 if error else records(app, result), error)
+
+    def prometheusText(self):
+        lines = [
+            "# HELP weatherapp_operation_calls_total Calls per WeatherApp operation.",
+            "# TYPE weatherapp_operation_calls_total counter",
+        ]
+        lines += [f'weatherapp_operation_calls_total{{operation="{n}"}} {op["calls"]}' for n, op in self.operations.items()]
+        lines += ["# HELP weatherapp_operation_errors_total Calls that raised an exception.",
+                  "# TYPE weatherapp_operation_errors_total counter"]
+        lines += [f'weatherapp_operation_errors_total{{operation="{n}"}} {op["errors"]}' for n, op in self.operations.items()]
+        lines += ["# HELP weatherapp_operation_records_total Records processed per operation.",
+                  "# TYPE weatherapp_operation_records_total counter"]
+        lines += [f'weatherapp_operation_records_total{{operation="{n}"}} {op["records"]}' for n, op in self.operations.items()]
+        lines += ["# HELP weatherapp_operation_duration_seconds Latency of WeatherApp operations.",
+                  "# TYPE weatherapp_operation_duration_seconds histogram"]
+        for n, op in self.operations.items():
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS, op["buckets"]):
+                cumulative += count
+                lines.append(f'weatherapp_operation_duration_seconds_bucket{{operation="{n}",le="{bound}"}} {cumulative}')
+            lines.append(f'weatherapp_operation_duration_seconds_bucket{{operation="{n}",le="+Inf"}} {op["calls"]}')
+            lines.append(f'weatherapp_operation_duration_seconds_sum{{operation="{n}"}} {op["seconds"]}')
+            lines.append(f'weatherapp_operation_duration_seconds_count{{operation="{n}"}} {op["calls"]}')
+        return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, filename="weather_metrics.prom"):
+        temp_name = filename + ".tmp" #written next to the target and renamed, so a scraper never sees half a file
+        with open(temp_name, "w") as f:
+            f.write(self.prometheusText())
+        os.replace(temp_name, filename)
+
+def instrumented(name, records=lambda app, result: 1):
+    #when app.metrics is None the only cost is this attribute check
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None:
+                return method(self, *args, **kwargs)
+            return metrics.call(name, records, method, self, args, kwargs)
+        return wrapper
+    return decorate
+
+def _cityCount(app, result):
+    return len(app.weatherDataList)
+
+def _changedCount(app, result): #add/update/delete return the record they changed, or a falsy value if nothing was
+    return 1 if result else 0
+
+def _loadedCount(app, result): #loads keep their BulkResult in app.lastLoad, ndjson loads return an offset instead
+    return app.lastLoad.added if app.lastLoad is not None else 0
+
+DEFAULT_CITIES = ( #this part is collected from various websites and merged into one complete list
+    ("Tokyo", "Asia", 22, "Sunny", 10, 60),
+    ("New York", "North America", 18, "Cloudy", 12, 55),
+    ("São Paulo", "South America", 25, "Rainy", 8, 80),
+    ("Cairo", "Africa", 30, "Sunny", 15, 30),
+    ("London", "Europe", 16, "Cloudy", 20, 70),
+    ("Sydney", "Australia", 20, "Sunny", 18, 65),
+    ("Moscow", "Europe", 5, "Snowy", 25, 75),
+    ("Delhi", "Asia", 35, "Sunny", 10, 40),
+    ("Lagos", "Africa", 28, "Sunny", 22, 55),
+    ("Toronto", "North America", 10, "Cloudy", 14, 60),
+    ("Paris", "Europe", 17, "Rainy", 12, 65),
+    ("Jakarta", "Asia", 29, "Stormy", 30, 90),
+    ("Mexico City", "North America", 20, "Sunny", 10, 55),
+    ("Cape Town", "Africa", 23, "Sunny", 20, 60),
+    ("Berlin", "Europe", 15, "Cloudy", 15, 60),
+    ("Seoul", "Asia", 21, "Sunny", 14, 55),
+    ("Chicago", "North America", 12, "Rainy", 20, 75),
+    ("Rio de Janeiro", "South America", 26, "Sunny", 12, 60),
+    ("Athens", "Europe", 24, "Sunny", 15, 55),
+    ("Bangkok", "Asia", 31, "Stormy", 35, 85),
+    ("Lima", "South America", 22, "Cloudy", 10, 50),
+    ("Nairobi", "Africa", 27, "Sunny", 18, 40),
+    ("Brisbane", "Australia", 21, "Sunny", 12, 50),
+    ("Rome", "Europe", 19, "Sunny", 14, 55),
+    ("Singapore", "Asia", 28, "Rainy", 20, 85),
+    ("Houston", "North America", 25, "Sunny", 15, 60),
+    ("Auckland", "Australia", 17, "Cloudy", 11, 65),
+    ("Lisbon", "Europe", 23, "Sunny", 12, 60),
+    ("Istanbul", "Europe", 20, "Cloudy", 16, 65),
+    ("Dubai", "Asia", 38, "Sunny", 18, 20),
+    ("Kuala Lumpur", "Asia", 30, "Rainy", 15, 80),
+    ("Buenos Aires", "South America", 20, "Cloudy", 10, 75),
+    ("Santiago", "South America", 21, "Sunny", 8, 55),
+    ("Casablanca", "Africa", 25, "Sunny", 14, 60),
+    ("Algiers", "Africa", 27, "Sunny", 13, 55),
+    ("Reykjavik", "Europe", 8, "Snowy", 20, 70),
+    ("Honolulu", "Australia", 27, "Sunny", 10, 60),
+    ("Manila", "Asia", 32, "Rainy", 20, 90),
+    ("Bogotá", "South America", 16, "Cloudy", 12, 65),
+    ("Helsinki", "Europe", 10, "Cloudy", 15, 75),
+    ("Zurich", "Europe", 18, "Rainy", 14, 70),
+    ("Vienna", "Europe", 19, "Sunny", 12, 65),
+    ("Warsaw", "Europe", 17, "Cloudy", 10, 60),
+    ("Lahore", "Asia", 34, "Sunny", 14, 40),
+    ("Karachi", "Asia", 33, "Sunny", 16, 45),
+    ("Tehran", "Asia", 28, "Sunny", 13, 30),
+    ("Baghdad", "Asia", 36, "Sunny", 20, 25),
+    ("Melbourne", "Australia", 19, "Cloudy", 13, 70),
+    ("Adelaide", "Australia", 22, "Sunny", 14, 55),
+    ("Perth", "Australia", 25, "Sunny", 15, 50),
+    ("Montreal", "North America", 9, "Cloudy", 15, 65),
+    ("Calgary", "North America", 7, "Snowy", 18, 70),
+    ("Edmonton", "North America", 6, "Snowy", 20, 75),
+    ("Vancouver", "North America", 14, "Rainy", 16, 80),
+    ("Ottawa", "North America", 12, "Cloudy", 14, 60),
+    ("Detroit", "North America", 11, "Rainy", 19, 70),
+    ("Minneapolis", "North America", 10, "Snowy", 22, 75),
+    ("Phoenix", "North America", 29, "Sunny", 12, 30),
+    ("Las Vegas", "North America", 35, "Sunny", 10, 20),
+    ("Guatemala City", "North America", 24, "Rainy", 14, 80),
+    ("San Francisco", "North America", 17, "Cloudy", 13, 60),
+    ("Seattle", "North America", 14, "Rainy", 15, 85),
+    ("Caracas", "South America", 27, "Sunny", 14, 55),
+    ("Quito", "South America", 20, "Sunny", 12, 60),
+    ("Medellín", "South America", 22, "Cloudy", 10, 65),
+    ("Brasília", "South America", 25, "Sunny", 13, 50),
+)
+
+class FrozenWeatherData(WeatherData): #read-only records, so one set of default cities can be shared by every app
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Shared default cities are read-only, use CityStore.update to change a city")
+
+    def __init__(self, city, continent, temperature, condition, windSpeed, humidity):
+        for field, value in zip(WeatherData.__slots__, (city, continent, temperature, condition, windSpeed, humidity)):
+            object.__setattr__(self, field, value)
+
+_frozenDefaults = None
+
+def frozenDefaultCities(): #built on first use and then shared, CityStore.update replaces records so nothing is copied
+    global _frozenDefaults
+    if _frozenDefaults is None:
+        _frozenDefaults = tuple(FrozenWeatherData(*city) for city in DEFAULT_CITIES)
+    return _frozenDefaults
+
+class RejectedEntry: #stands in for an input entry that was already found broken, bulk_add records it as an error
+    __slots__ = ("reason",)
+
+    def __init__(self, reason):
+        self.reason = reason
+
+class BulkResult: #what bulk_add did, instead of one printed line per city
+    def __init__(self):
+        self.added = 0
+        self.duplicates = [] #(position in the input, city)
+        self.errors = [] #(position in the input, reason)
+
+    def summary(self):
+        message = f"{self.added} cities."
+        if self.duplicates:
+            message += f" Skipped {len(self.duplicates)} duplicates."
+        if self.errors:
+            message += f" Rejected {len(self.errors)} invalid entries."
+        return message
+
+class WeatherApp:
+    MAX_FORECAST_HOURS = 14 * 24 #longest forecast generateAllHourlyForecasts makes, its matrix grows with hours * cities
+
+    def __init__(self, forecastCacheEntries=10000, forecastCacheBytes=None, metrics=None, defaultCities=True):
+        self.metrics = metrics #an OperationMetrics to time the operations, None keeps instrumentation off
+        self.weatherDataList = CityStore()
+        self.continentStats = ContinentAggregates()
+        self.weatherDataList.addObserver(self.continentStats)
+        self.hourlyForecasts = ForecastCache(self._buildForecast, forecastCacheEntries, forecastCacheBytes)
+        self.weatherDataList.addObserver(self.hourlyForecasts)
         self.alert_handler = WeatherAlertHandler() # begin the alerthandler
-        self.loadDefaultCities()
+        self.journal = None
+        self._compaction = None
+        self._indexes = None #sorted field indexes, built the first time a top-k or range query needs them
+        self.history = None #ObservationHistory once enableHistory is called
+        self.lastLoad = None #BulkResult of the last loadDataFromFile/loadSnapshot
+        self._search = None #CitySearchIndex, built on the first search or the first lookup that misses
+        if defaultCities:
+            self.loadDefaultCities()
 
     @staticmethod
     def is_valid_int(value):
@@ -144,213 +1727,334 @@ class WeatherApp:
         except ValueError:
             return False
 
-    def loadDefaultCities(self): #this part is collected from various websites and merged into one complete list
-        default_cities = [
-            ("Tokyo", "Asia", 22, "Sunny", 10, 60),
-            ("New York", "North America", 18, "Cloudy", 12, 55),
-            ("São Paulo", "South America", 25, "Rainy", 8, 80),
-            ("Cairo", "Africa", 30, "Sunny", 15, 30),
-            ("London", "Europe", 16, "Cloudy", 20, 70),
-            ("Sydney", "Australia", 20, "Sunny", 18, 65),
-            ("Moscow", "Europe", 5, "Snowy", 25, 75),
-            ("Delhi", "Asia", 35, "Sunny", 10, 40),
-            ("Lagos", "Africa", 28, "Sunny", 22, 55),
-            ("Toronto", "North America", 10, "Cloudy", 14, 60),
-            ("Paris", "Europe", 17, "Rainy", 12, 65),
-            ("Jakarta", "Asia", 29, "Stormy", 30, 90),
-            ("Mexico City", "North America", 20, "Sunny", 10, 55),
-            ("Cape Town", "Africa", 23, "Sunny", 20, 60),
-            ("Berlin", "Europe", 15, "Cloudy", 15, 60),
-            ("Seoul", "Asia", 21, "Sunny", 14, 55),
-            ("Chicago", "North America", 12, "Rainy", 20, 75),
-            ("Rio de Janeiro", "South America", 26, "Sunny", 12, 60),
-            ("Athens", "Europe", 24, "Sunny", 15, 55),
-            ("Bangkok", "Asia", 31, "Stormy", 35, 85),
-            ("Lima", "South America", 22, "Cloudy", 10, 50),
-            ("Nairobi", "Africa", 27, "Sunny", 18, 40),
-            ("Brisbane", "Australia", 21, "Sunny", 12, 50),
-            ("Rome", "Europe", 19, "Sunny", 14, 55),
-            ("Singapore", "Asia", 28, "Rainy", 20, 85),
-            ("Houston", "North America", 25, "Sunny", 15, 60),
-            ("Auckland", "Australia", 17, "Cloudy", 11, 65),
-            ("Lisbon", "Europe", 23, "Sunny", 12, 60),
-            ("Istanbul", "Europe", 20, "Cloudy", 16, 65),
-            ("Dubai", "Asia", 38, "Sunny", 18, 20),
-            ("Kuala Lumpur", "Asia", 30, "Rainy", 15, 80),
-            ("Buenos Aires", "South America", 20, "Cloudy", 10, 75),
-            ("Santiago", "South America", 21, "Sunny", 8, 55),
-            ("Casablanca", "Africa", 25, "Sunny", 14, 60),
-            ("Algiers", "Africa", 27, "Sunny", 13, 55),
-            ("Reykjavik", "Europe", 8, "Snowy", 20, 70),
-            ("Honolulu", "Australia", 27, "Sunny", 10, 60),
-            ("Manila", "Asia", 32, "Rainy", 20, 90),
-            ("Bogotá", "South America", 16, "Cloudy", 12, 65),
-            ("Helsinki", "Europe", 10, "Cloudy", 15, 75),
-            ("Zurich", "Europe", 18, "Rainy", 14, 70),
-            ("Vienna", "Europe", 19, "Sunny", 12, 65),
-            ("Warsaw", "Europe", 17, "Cloudy", 10, 60),
-            ("Lahore", "Asia", 34, "Sunny", 14, 40),
-            ("Karachi", "Asia", 33, "Sunny", 16, 45),
-            ("Tehran", "Asia", 28, "Sunny", 13, 30),
-            ("Baghdad", "Asia", 36, "Sunny", 20, 25),
-            ("Melbourne", "Australia", 19, "Cloudy", 13, 70),
-            ("Adelaide", "Australia", 22, "Sunny", 14, 55),
-            ("Perth", "Australia", 25, "Sunny", 15, 50),
-            ("Montreal", "North America", 9, "Cloudy", 15, 65),
-            ("Calgary", "North America", 7, "Snowy", 18, 70),
-            ("Edmonton", "North America", 6, "Snowy", 20, 75),
-            ("Vancouver", "North America", 14, "Rainy", 16, 80),
-            ("Ottawa", "North America", 12, "Cloudy", 14, 60),
-            ("Detroit", "North America", 11, "Rainy", 19, 70),
-            ("Minneapolis", "North America", 10, "Snowy", 22, 75),
-            ("Phoenix", "North America", 29, "Sunny", 12, 30),
-            ("Las Vegas", "North America", 35, "Sunny", 10, 20),
-            ("Guatemala City", "North America", 24, "Rainy", 14, 80),
-            ("San Francisco", "North America", 17, "Cloudy", 13, 60),
-            ("Seattle", "North America", 14, "Rainy", 15, 85),
-            ("Caracas", "South America", 27, "Sunny", 14, 55),
-            ("Quito", "South America", 20, "Sunny", 12, 60),
-            ("Medellín", "South America", 22, "Cloudy", 10, 65),
-            ("Brasília", "South America", 25, "Sunny", 13, 50),
-        ]
-        for city, cont, temp, cond, wind, humid in default_cities:
-            self.addWeatherData(city, cont, temp, cond, wind, humid)
+    def loadDefaultCities(self):
+        self.weatherDataList.seed(frozenDefaultCities())
+
+    @staticmethod
+    def _toNumber(value, field):
+        if isinstance(value, bool):
+            raise ValueError(f"{field} must be a number")
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            pass
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number, got {value!r}") from None
+
+    @classmethod
+    def _toWeatherData(cls, entry):
+        #accepts WeatherData (or rows), dicts like the save files and (city, continent, temp, condition, wind, humidity) tuples
+        if isinstance(entry, RejectedEntry):
+            raise ValueError(entry.reason)
+        if isinstance(entry, dict):
+            missing = [field for field in WeatherData.__slots__ if field not in entry]
+            if missing:
+                raise ValueError(f"Missing fields: {', '.join(missing)}")
+            values = [entry[field] for field in WeatherData.__slots__]
+        elif isinstance(entry, (tuple, list)):
+            if len(entry) != 6:
+                raise ValueError(f"Expected 6 values, got {len(entry)}")
+            values = list(entry)
+        elif all(hasattr(entry, field) for field in WeatherData.__slots__):
+            values = [getattr(entry, field) for field in WeatherData.__slots__]
+        else:
+            raise ValueError(f"Cannot read weather data from {type(entry).__name__}")
+        city, continent, temperature, condition, windSpeed, humidity = values
+        if not isinstance(city, str) or not city.strip():
+            raise ValueError("city must be a non-empty string")
+        return WeatherData(city, str(continent), cls._toNumber(temperature, "temperature"), str(condition),
+                           cls._toNumber(windSpeed, "windSpeed"), cls._toNumber(humidity, "humidity"))
+
+    @instrumented("bulk_add", records=lambda app, result: result.added)
+    def bulk_add(self, records, batch_size=10000):
+        #quiet bulk insert: nothing is printed per city, duplicates and bad entries are collected in the result
+        result = BulkResult()
+        store = self.weatherDataList
+        index = 0
+        for batch in batched(records, batch_size):
+            valid = []
+            for entry in batch:
+                try:
+                    valid.append((index, self._toWeatherData(entry)))
+                except ValueError as e:
+                    result.errors.append((index, str(e)))
+                index += 1
+            for i, data in valid:
+                if store.add(data):
+                    result.added += 1
+                else:
+                    result.duplicates.append((i, data.city))
+        return result
 
+    @instrumented("import_csv", records=lambda app, result: result.added)
+    def importCsv(self, filename, delimiter=None, batch_size=10000):
+        #streams a csv/tsv observation dump through bulk_add, the header row names the columns in any order
+        import csv
+        if not os.path.exists(filename):
+            print("No CSV file found.")
+            return BulkResult()
+        with open(filename, newline="", encoding="utf-8") as f:
+            header_line = f.readline()
+            if delimiter is None:
+                delimiter = "\t" if filename.endswith(".tsv") or "\t" in header_line else ","
+            header = [name.strip().replace("_", "").casefold() for name in next(csv.reader([header_line], delimiter=delimiter))]
+            aliases = {"wind": "windspeed", "temp": "temperature"}
+            header = [aliases.get(name, name) for name in header]
+            missing = [field for field in WeatherData.__slots__ if field.casefold() not in header]
+            if missing:
+                result = BulkResult()
+                result.errors.append((0, f"Missing columns: {', '.join(missing)}"))
+                print(f"Could not import {filename}: missing columns {', '.join(missing)}")
+                return result
+            columns = [header.index(field.casefold()) for field in WeatherData.__slots__]
+            width = max(columns) + 1
+            rows = (tuple(row[c] for c in columns) if len(row) >= width
+                    else RejectedEntry(f"Expected {width} columns, got {len(row)}")
+                    for row in csv.reader(f, delimiter=delimiter) if any(cell.strip() for cell in row)) #blank lines skipped
+            result = self.bulk_add(rows, batch_size)
+        print(f"Imported {filename}. Loaded {result.summary()}")
+        return result
+
+    @instrumented("add", records=_changedCount)
     def addWeatherData(self, city, continent, temperature, condition, windSpeed, humidity):
         data = WeatherData(city, continent, temperature, condition, windSpeed, humidity)
-        if not any(data.city.lower() == existing_data.city.lower() for existing_data in self.weatherDataList):
-            self.weatherDataList.append(data)
+        if self.weatherDataList.add(data):
             print(f"Added weather data for {city}.")
-        else:
-            print(f"Weather data for {city} already exists use 'Update city info' to modify.")
+            return data
+        print(f"Weather data for {city} already exists use 'Update city info' to modify.")
+        return None
 
     def listCities(self):
-        if not self.weatherDataList:
+        cities = self.weatherDataList.snapshot() #other threads can keep adding and deleting while this prints
+        if not cities:
             print("\nNo cities available. Add some weather data first!")
             return
         print("\n🌍 Cities Weather Data:")
-        for i, data in enumerate(self.weatherDataList):
+        for i, data in enumerate(cities):
             print(f"{i+1}. {data}")
 
-    def generateHourlyForecast(self, city):
-        base = None
-        for data in self.weatherDataList:
-            if data.city.lower() == city.lower():
-                base = data
-                break
+    @instrumented("forecast", records=lambda app, result: 0 if result is None else len(result))
+    def generateHourlyForecast(self, city, seed=None):
+        base = self.findCity(city)
         if not base:
             print("City not found.")
-            return
+            self._printSuggestions(city)
+            return None
 
-        forecasts = []
-        for hour in range(24):
-            temp_variation = random.randint(-3, 3)
-            humidity_variation = random.randint(-10, 10)
-            wind_variation = random.randint(-5, 5)
-            condition = random.choice(["Sunny", "Cloudy", "Rainy", "Stormy", "Snowy"])
-            forecast = WeatherData(
-                city=base.city,
-                continent=base.continent,
-                temperature=base.temperature + temp_variation,
-                condition=condition,
-                windSpeed=max(0, base.windSpeed + wind_variation),
-                humidity=max(0, min(100, base.humidity + humidity_variation))
-            )
-            forecasts.append(forecast)
-        self.hourlyForecasts[city.lower()] = forecasts # storing it with lowercase city for consistency
+        city_key = CityStore.cityKey(base.city)
+        forecast = self.hourlyForecasts[city_key] = self._buildForecast(city_key, seed) # storing it with the normalized city key for consistency
         print(f"Generated 24-hour forecast for {city}.")
+        return forecast
+
+    def _buildForecast(self, city_key, seed=None): #also what the forecast cache calls on a miss
+        base = self.weatherDataList.get(city_key)
+        if not base:
+            return None
+        if seed is None:
+            seed = random.getrandbits(64)
+        matrix = ForecastMatrix(24)
+        matrix.fill([base], seed) #same per-city stream as generateAllHourlyForecasts, so a seeded run gives the same hours
+        return matrix.forCity(city_key)
+
+    @instrumented("forecast_all", records=lambda app, result: len(result.table))
+    def generateAllHourlyForecasts(self, seed=None, hours=24, workers=None, chunk_size=None):
+        #workers > 1 spreads the cities over a process pool, the result is identical for any worker count
+        if not 1 <= hours <= self.MAX_FORECAST_HOURS:
+            raise ValueError(f"hours must be between 1 and {self.MAX_FORECAST_HOURS}")
+        if seed is None:
+            seed = random.getrandbits(64)
+        matrix = ForecastMatrix(hours)
+        matrix.fill(list(self.weatherDataList), seed, workers, chunk_size)
+        if hours == 24: #the cache holds 24-hour forecasts (showHourlyForecast says so), other lengths are only returned
+            for city_key in matrix.startRows:
+                self.hourlyForecasts[city_key] = matrix.forCity(city_key)
+        print(f"Generated {hours}-hour forecasts for {len(matrix)} cities.")
+        return matrix
 
 
     def showHourlyForecast(self, city):
-        city_key = city.lower()
-        if city_key not in self.hourlyForecasts:
-            print(f"No hourly forecast generated for {city}.")
+        base = self.findCity(city)
+        forecast = self.hourlyForecasts.get(CityStore.cityKey(base.city)) if base else None #generated on the spot if needed
+        if forecast is None:
+            print(f"No hourly forecast available for {city}, city not found.")
+            self._printSuggestions(city)
             return
         print(f"\n🕒 24-hour forecast for {city}:")
-        for i, f in enumerate(self.hourlyForecasts[city_key]):
+        for i, f in enumerate(forecast):
             print(f"Hour {i}: {f.temperature}°C, {f.condition}, Wind: {f.windSpeed} km/h, Humidity: {f.humidity}%")
 
+    @instrumented("report", records=_cityCount)
     def generateReport(self):
         if not self.weatherDataList:
             print("\nNo weather data available to generate a report.")
             return
 
+        with self.weatherDataList.lock: #the sums move with every write, copy the averages in one go
+            averages = [(cont, stats.mean("temperature"), stats.mean("humidity"), stats.mean("windSpeed"))
+                        for cont, stats in self.continentStats.continents.items()] #kept up to date by the store
+
         print("\n📊 Weather Report by Continent:")
-        continent_data = defaultdict(list)
-        for data in self.weatherDataList:
-            continent_data[data.continent].append(data)
+        for cont, avg_temp, avg_humidity, avg_wind in averages:
+            print(f"{cont}: Avg Temp {avg_temp:.1f}°C, Avg Humidity {avg_humidity:.1f}%, Avg Wind {avg_wind:.1f} km/h")
+
+    def getContinentStats(self):
+        with self.weatherDataList.lock:
+            return {
+                cont: {
+                    "count": stats.count,
+                    **{f"avg_{field}": stats.mean(field) for field in ContinentStats.FIELDS},
+                    **{f"stddev_{field}": stats.stddev(field) for field in ContinentStats.FIELDS},
+                }
+                for cont, stats in self.continentStats.continents.items()
+            }
 
-        for cont, cities in continent_data.items():
-            temps = [c.temperature for c in cities]
-            humidity = [c.humidity for c in cities]
-            winds = [c.windSpeed for c in cities]
+    def _searchIndex(self, fuzzy=False):
+        #the exact and prefix parts are cheap, the trigram part for fuzzy search is only built once something needs it
+        index = self._search
+        if index is None or index.stale or (fuzzy and not index.fuzzyReady):
+            with self.weatherDataList.lock: #no change can slip in between building it and subscribing it
+                if self._search is None or self._search.stale: #cleared since it was built, rebuilt with one sort
+                    if self._search is not None:
+                        self.weatherDataList.removeObserver(self._search)
+                    self._search = CitySearchIndex(self.weatherDataList)
+                    self.weatherDataList.addObserver(self._search)
+                if fuzzy:
+                    self._search.buildFuzzy()
+        return self._search
 
-            avg_temp = sum(temps) / len(temps) if temps else 0
-            avg_humidity = sum(humidity) / len(humidity) if humidity else 0
-            avg_wind = sum(winds) / len(winds) if winds else 0
+    def findCity(self, city):
+        #exact (case-insensitive) match first, then a unique accent/space-insensitive match like "sao paulo" -> São Paulo
+        data = self.weatherDataList.get(city)
+        if data is None:
+            matches = self._searchIndex().exact(city)
+            if len(matches) == 1:
+                data = self.weatherDataList.get(matches[0])
+        return data
 
-            print(f"{cont}: Avg Temp {avg_temp:.1f}°C, Avg Humidity {avg_humidity:.1f}%, Avg Wind {avg_wind:.1f} km/h")
+    def searchCities(self, query, limit=10):
+        #autocomplete matches first, then the closest names by edit distance
+        index = self._searchIndex(fuzzy=True)
+        keys = index.prefix(query, limit)
+        if len(keys) < limit:
+            keys += [key for key, _ in index.fuzzy(query, limit) if key not in keys][:limit - len(keys)]
+        return [self.weatherDataList.get(key) for key in keys]
+
+    def _printSuggestions(self, city):
+        index = self._searchIndex()
+        if not index.fuzzyReady and len(self.weatherDataList) > CitySearchIndex.SUGGEST_BUILD_LIMIT:
+            return #building the trigram part of a big store takes seconds, a typo in the menu shouldn't wait for it
+        suggestions = [self.weatherDataList.get(key).city for key, _ in self._searchIndex(fuzzy=True).fuzzy(city, 3)]
+        if suggestions:
+            print(f"Did you mean: {', '.join(suggestions)}?")
+
+    def enableHistory(self, capacity=256, hourlyCapacity=24 * 14, dailyCapacity=365, clock=time.time):
+        #keeps a bounded time series per city from now on, starting with the current observations
+        if self.history is None:
+            with self.weatherDataList.lock:
+                self.history = ObservationHistory(capacity, hourlyCapacity, dailyCapacity, clock)
+                for data in self.weatherDataList:
+                    self.history.record(data)
+                self.weatherDataList.addObserver(self.history)
+        return self.history
+
+    def cityHistory(self, city, start=None, end=None):
+        history = self.history.get(city) if self.history else None
+        if history is None:
+            return None
+        return history.query(start, end)
+
+    def _cityIndexes(self):
+        if self._indexes is None or self._indexes.stale:
+            with self.weatherDataList.lock:
+                if self._indexes is not None: #cleared since it was built, one sort now beats an insort per reloaded city
+                    self.weatherDataList.removeObserver(self._indexes)
+                self._indexes = CityIndexes(self.weatherDataList)
+                self.weatherDataList.addObserver(self._indexes)
+        return self._indexes
 
+    def _recordsFor(self, keys):
+        cities = self.weatherDataList
+        return [cities.get(key) for key in keys]
+
+    def topCities(self, field, k=10, continent=None, largest=True):
+        #e.g. topCities("temperature", 10, "Asia") for the 10 hottest cities in Asia
+        return self._recordsFor(self._cityIndexes().index(field, continent).top(k, largest))
+
+    def citiesInRange(self, field, low=None, high=None, continent=None):
+        #e.g. citiesInRange("windSpeed", 20, 40) for all cities with wind between 20 and 40 km/h (inclusive)
+        return self._recordsFor(self._cityIndexes().index(field, continent).range(low, high))
+
+    def topPercent(self, field, percent, continent=None, largest=True):
+        index = self._cityIndexes().index(field, continent)
+        k = -(-len(index) * percent // 100) if percent > 0 else 0
+        return self._recordsFor(index.top(int(k), largest))
+
+    @instrumented("update", records=_changedCount)
     def updateCityInfo(self, city):
-        found = False
-        for data in self.weatherDataList:
-            if data.city.lower() == city.lower():
-                found = True
-                print(f"Updating info for {data.city} (leave blank to keep current)")
-
-                new_temp = input(f"Current temp {data.temperature}°C, new: ")
-                if new_temp.strip():
-                    if self.is_valid_int(new_temp):
-                        data.temperature = int(new_temp)
-                    else:
-                        print("Invalid input for temperature. Skipping...")
-
-                new_condition = input(f"Current condition '{data.condition}', new: ")
-                if new_condition.strip():
-                    data.condition = new_condition
-
-                new_wind = input(f"Current wind speed {data.windSpeed} km/h, new: ")
-                if new_wind.strip():
-                    if self.is_valid_int(new_wind):
-                        data.windSpeed = int(new_wind)
-                    else:
-                        print("Invalid input for wind speed. Skipping...")
-
-                new_humidity = input(f"Current humidity {data.humidity}%, new: ")
-                if new_humidity.strip():
-                    if self.is_valid_int(new_humidity):
-                        data.humidity = int(new_humidity)
-                    else:
-                        print("Invalid input for humidity. Skipping...")
-
-                print(f"City info for {city} updated successfully.")
-                return
-        if not found:
+        data = self.findCity(city)
+        if not data:
             print(f"City '{city}' not found. Please try again.")
+            self._printSuggestions(city)
+            return
+        print(f"Updating info for {data.city} (leave blank to keep current)")
+        changes = {}
+
+        new_temp = input(f"Current temp {data.temperature}°C, new: ")
+        if new_temp.strip():
+            if self.is_valid_int(new_temp):
+                changes["temperature"] = int(new_temp)
+            else:
+                print("Invalid input for temperature. Skipping...")
 
+        new_condition = input(f"Current condition '{data.condition}', new: ")
+        if new_condition.strip():
+            changes["condition"] = new_condition
+
+        new_wind = input(f"Current wind speed {data.windSpeed} km/h, new: ")
+        if new_wind.strip():
+            if self.is_valid_int(new_wind):
+                changes["windSpeed"] = int(new_wind)
+            else:
+                print("Invalid input for wind speed. Skipping...")
+
+        new_humidity = input(f"Current humidity {data.humidity}%, new: ")
+        if new_humidity.strip():
+            if self.is_valid_int(new_humidity):
+                changes["humidity"] = int(new_humidity)
+            else:
+                print("Invalid input for humidity. Skipping...")
+
+        updated = self.weatherDataList.update(data.city, **changes) if changes else None
+        print(f"City info for {city} updated successfully.")
+        return updated
+
+    @instrumented("delete", records=_changedCount)
     def deleteCity(self, city):
-        initial_len = len(self.weatherDataList)
-        self.weatherDataList = [data for data in self.weatherDataList if data.city.lower() != city.lower()]
-        if city.lower() in self.hourlyForecasts:
-            del self.hourlyForecasts[city.lower()]
+        found = self.findCity(city)
+        removed = self.weatherDataList.delete(found.city) if found else None #observers (forecast cache etc.) follow
 
-        if len(self.weatherDataList) < initial_len:
+        if removed:
             print(f"{city} deleted.")
         else:
             print(f"City '{city}' not found.")
+            self._printSuggestions(city)
+        return removed
 
-    def saveDataToFile(self, filename="weather_data.json"):
-        data_to_save = [
-            {
-                "city": d.city,
-                "continent": d.continent,
-                "temperature": d.temperature,
-                "condition": d.condition,
-                "windSpeed": d.windSpeed,
-                "humidity": d.humidity
-            }
-            for d in self.weatherDataList
-        ]
+    @instrumented("save", records=_cityCount)
+    def saveDataToFile(self, filename="weather_data.json", streaming=None):
+        if streaming is None:
+            streaming = filename.endswith((".ndjson", ".jsonl"))
+        cities = self.weatherDataList.snapshot() #one consistent state even if other threads write meanwhile
+        if streaming:
+            NdjsonWeatherFile.writeRecords(filename, cities)
+            print(f"Data saved to {filename}")
+            return
+
+        data_to_save = [WeatherData.toDict(d) for d in cities]
         data_package = {
             "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "data": data_to_save
@@ -359,30 +2063,130 @@ class WeatherApp:
             json.dump(data_package, f, indent=2)
         print(f"Data saved to {filename}")
 
-    def loadDataFromFile(self, filename="weather_data.json"):
+    @instrumented("load", records=_loadedCount)
+    def loadDataFromFile(self, filename="weather_data.json", offset=0, limit=None, batch_size=1000):
+        self.lastLoad = None
         if not os.path.exists(filename):
             print("No save data file found.")
             return
 
+        if NdjsonWeatherFile.isNdjson(filename):
+            return self._loadNdjson(filename, offset, limit, batch_size)
+
         with open(filename, "r") as f:
             loaded_package = json.load(f)
+        if not isinstance(loaded_package, dict) or not isinstance(loaded_package.get("data", []), list):
+            raise ValueError(f"{filename} is not a weather data file") #checked before the clear, the cities stay as they were
 
-        self.weatherDataList = [] # Clear existing data before loading
-        loaded_count = 0
-        for entry in loaded_package.get("data", []):
-            self.addWeatherData(entry["city"], entry["continent"], entry["temperature"],
-                                 entry["condition"], entry["windSpeed"], entry["humidity"])
-            loaded_count += 1
-        print(f"Data loaded from {filename}. Loaded {loaded_count} cities.")
+        self.weatherDataList.clear() # Clear existing data before loading
+        result = self.lastLoad = self.bulk_add(loaded_package.get("data", []))
+        print(f"Data loaded from {filename}. Loaded {result.summary()}")
 
+    @instrumented("save_snapshot", records=_cityCount)
+    def saveSnapshot(self, filename="weather_data.snap"):
+        count = WeatherSnapshot.write(filename, self.weatherDataList)
+        print(f"Snapshot of {count} cities saved to {filename}")
 
-    def showWeatherAlerts(self, city):
-        found_city = None
-        for data in self.weatherDataList:
-            if data.city.lower() == city.lower():
-                found_city = data
-                break
+    @instrumented("load_snapshot", records=_loadedCount)
+    def loadSnapshot(self, filename="weather_data.snap"):
+        self.lastLoad = None
+        if not os.path.exists(filename):
+            print("No snapshot file found.")
+            return
+        with WeatherSnapshot(filename) as snapshot:
+            self.weatherDataList.clear()
+            result = self.lastLoad = self.bulk_add(snapshot)
+        print(f"Snapshot loaded from {filename}. Loaded {result.summary()}")
+
+    def enableJournal(self, baseFile="weather_data.ndjson", journalFile=None, batchSize=100, compactThreshold=10000):
+        #state = base file + replayed journal, after this every change is appended to the journal
+        if self.journal is not None:
+            self.disableJournal()
+        journalFile = journalFile or baseFile + ".journal"
+        self._journalFiles = (baseFile, journalFile, journalFile + ".compacting")
+        self.compactThreshold = compactThreshold
+        if os.path.exists(baseFile):
+            self.loadDataFromFile(baseFile)
+        else: #the current cities become the base, otherwise they would be missing after a restart
+            NdjsonWeatherFile.writeRecords(baseFile, self.weatherDataList)
+        #a .compacting file means a compaction did not finish, its changes come before the current journal
+        compactingFile = self._journalFiles[2]
+        leftovers = [name for name in (compactingFile, journalFile) if os.path.exists(name)]
+        replayed = WeatherJournal.replay(compactingFile, self.weatherDataList)
+        replayed += WeatherJournal.replay(journalFile, self.weatherDataList)
+        if replayed:
+            print(f"Replayed {replayed} changes from the journal.")
+        if leftovers: #fold the replayed logs into a new base, else they'd be replayed on every start and block compaction
+            temp_file = baseFile + ".tmp"
+            NdjsonWeatherFile.writeRecords(temp_file, self.weatherDataList)
+            os.replace(temp_file, baseFile)
+            for name in leftovers: #the .compacting one first, a crash in between only replays changes already in the base
+                os.remove(name)
+        self.journal = WeatherJournal(journalFile, batchSize)
+        self.journal.onFlush = self._maybeCompact
+        self.weatherDataList.addObserver(self.journal)
 
+    def disableJournal(self):
+        if self.journal is None:
+            return
+        with self.weatherDataList.lock: #writers append under the store lock, a change can't slip in between the flush and the unsubscribe
+            self.journal.close()
+            self.weatherDataList.observers.remove(self.journal)
+        self.waitForCompaction()
+        self.journal = None
+
+    def saveChanges(self): #with a journal a save costs as much as the number of changes, not the dataset size
+        if self.journal is None:
+            self.saveDataToFile()
+            return
+        with self.weatherDataList.lock: #same lock the writers append under, else an entry added during the flush is lost
+            count = self.journal.flush()
+        print(f"Saved {count} changes to {self.journal.filename}")
+
+    def _maybeCompact(self, journal):
+        if journal.entries < self.compactThreshold or (self._compaction and self._compaction.is_alive()):
+            return
+        base_file, _, compacting_file = self._journalFiles
+        if os.path.exists(compacting_file): #the previous compaction never finished, its log has to be kept
+            return
+        journal.rotate(compacting_file)
+        records = self.weatherDataList.snapshot() #records are replaced on update, never changed, so this stays consistent
+
+        def compact():
+            temp_file = base_file + ".tmp"
+            NdjsonWeatherFile.writeRecords(temp_file, records)
+            os.replace(temp_file, base_file)
+            os.remove(compacting_file) #only once the new base is in place, a crash before this just replays it again
+
+        self._compaction = threading.Thread(target=compact, name="weather-journal-compaction", daemon=True)
+        self._compaction.start()
+
+    def waitForCompaction(self):
+        if self._compaction is not None:
+            self._compaction.join()
+
+    def _loadNdjson(self, filename, offset, limit, batch_size):
+        #returns the offset reached, so a partial load (limit) can be continued with loadDataFromFile(filename, offset)
+        if not offset:
+            self.weatherDataList.clear() # Clear existing data before loading, unless we are resuming
+        records = NdjsonWeatherFile.readRecords(filename, offset)
+        if limit is not None:
+            records = itertools.islice(records, limit)
+        position = [offset]
+
+        def entries():
+            for entry, end in records:
+                position[0] = end
+                yield entry
+
+        result = self.lastLoad = self.bulk_add(entries(), batch_size)
+        print(f"Data loaded from {filename}. Loaded {result.summary()}")
+        return position[0]
+
+
+    @instrumented("alerts", records=lambda app, result: 0 if result is None else 1) #one city checked, or none on a miss
+    def showWeatherAlerts(self, city):
+        found_city = self.findCity(city)
         if found_city:
             alerts = self.alert_handler.get_alerts(found_city)
             if alerts:
@@ -391,16 +2195,20 @@ class WeatherApp:
                     print(f" - {a}")
             else:
                 print(f"No alerts for {city}.")
-        else:
-            print(f"City '{city}' not found.")
+            return alerts
+        print(f"City '{city}' not found.")
+        self._printSuggestions(city)
+        return None
 
 
     def analyzeForecast(self, city):
-        city_key = city.lower()
-        if city_key not in self.hourlyForecasts:
-            print(f"No hourly forecast available for {city}. Please generate one first.")
+        base = self.findCity(city)
+        forecast = self.hourlyForecasts.get(CityStore.cityKey(base.city)) if base else None
+        if forecast is None:
+            print(f"No hourly forecast available for {city}, city not found.")
+            self._printSuggestions(city)
             return
-        analyzer = ForecastAnalyzer(self.hourlyForecasts[city_key])
+        analyzer = ForecastAnalyzer(forecast)
         analyzer.printForecastAnalysis()
 
     def showMenu(self):
@@ -421,6 +2229,7 @@ class WeatherApp:
         print("10) Save Data to File")
         print("11) Load Data from File")
         print("12) Learn Weather Terms")
+        print("13) Search Cities")
         print("0) Exit")
         print("")
         print("-" * 50)
@@ -465,11 +2274,20 @@ class WeatherApp:
                 city = input("City to delete: ").strip()
                 self.deleteCity(city)
             elif choice == "10":
-                self.saveDataToFile()
+                self.saveChanges()
             elif choice == "11":
                 self.loadDataFromFile()
             elif choice == "12":
                 WeatherTermMeanings.showMenu()
+            elif choice == "13":
+                query = input("Search for a city: ").strip()
+                results = self.searchCities(query) if query else []
+                if results:
+                    print(f"\n🔎 Cities matching '{query}':")
+                    for i, data in enumerate(results):
+                        print(f"{i+1}. {data}")
+                else:
+                    print(f"No cities match '{query}'.")
             elif choice == "0":
                 print("Closing application.")
                 print("Goodbye!!!!")
@@ -477,66 +2295,1213 @@ class WeatherApp:
             else:
                 print("Invalid option. Please try again.")
 
-    class WeatherAppTestCase(unittest.TestCase):
-        def setUp(self):
-            self.app = WeatherApp()
-            self.app.weatherDataList.clear()
-            self.app.hourlyForecasts.clear()
-
-        def testAddWeatherData(self):
-            self.app.addWeatherData("TestCity", "TestLand", 25, "Sunny", 10, 50)
-            self.assertEqual(len(self.app.weatherDataList), 1)
-            self.assertEqual(self.app.weatherDataList[0].city, "TestCity")
-
-        def testDuplicateCity(self):
-            self.app.addWeatherData("TestCity", "TestLand", 25, "Sunny", 10, 50)
-            self.app.addWeatherData("TestCity", "TestLand", 30, "Cloudy", 12, 60)
-            self.assertEqual(len(self.app.weatherDataList), 1)
-
-        def testGenerateHourlyForecast(self):
-            self.app.addWeatherData("ForecastCity", "Continent", 20, "Cloudy", 10, 60)
-            self.app.generateHourlyForecast("ForecastCity")
-            self.assertIn("forecastcity", self.app.hourlyForecasts)
-            self.assertEqual(len(self.app.hourlyForecasts["forecastcity"]), 24)
-
-        def testWeatherAlerts(self):
-            self.app.addWeatherData("AlertCity", "Continent", 25, "Stormy", 35, 85)
-            alerts = self.app.alert_handler.get_alerts(self.app.weatherDataList[0])
-            self.assertIn("⚠️ Severe weather expected", alerts)
-            self.assertIn("💨 Fast winds warning", alerts)
-            self.assertIn("💧 Very humid", alerts)
-
-        def testForecastAnalyzer(self):
-            forecasts = [
-                WeatherData("X", "C", 15, "Rainy", 10, 60),
-                WeatherData("X", "C", 20, "Rainy", 12, 70),
-                WeatherData("X", "C", 10, "Sunny", 8, 50)
-            ]
-            analyzer = ForecastAnalyzer(forecasts)
-            self.assertEqual(analyzer.getMaxTemperature(), 20)
-            self.assertEqual(analyzer.getMinTemperature(), 10)
-            self.assertEqual(analyzer.getDominantCondition(), "Rainy")
-
-        def testSaveAndLoadData(self):
-            self.app.addWeatherData("SaveCity", "Continent", 22, "Sunny", 15, 55)
-            self.app.saveDataToFile("test_save.json")
-
-            new_app = WeatherApp()
-            new_app.weatherDataList.clear()
-            new_app.loadDataFromFile("test_save.json")
-            self.assertTrue(any(d.city == "SaveCity" for d in new_app.weatherDataList))
-
-        def testDeleteCity(self):
-            self.app.addWeatherData("DeleteCity", "Continent", 22, "Sunny", 15, 55)
-            self.assertEqual(len(self.app.weatherDataList), 1)
-            self.app.deleteCity("DeleteCity")
-            self.assertEqual(len(self.app.weatherDataList), 0)
+def batched(items, size): #lists of up to 'size' items, so big streams are handled a bounded chunk at a time
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class NdjsonWeatherFile: #newline delimited json, a header line with saved_at and then one city per line
+    FORMAT = "weather-ndjson"
+    VERSION = 1
+
+    @staticmethod
+    def isNdjson(filename):
+        with open(filename, "rb") as f:
+            first_line = f.readline()
+        try:
+            header = json.loads(first_line)
+        except ValueError:
+            return False
+        return isinstance(header, dict) and header.get("format") == NdjsonWeatherFile.FORMAT
+
+    @staticmethod
+    def writeRecords(filename, records):
+        header = {
+            "format": NdjsonWeatherFile.FORMAT,
+            "version": NdjsonWeatherFile.VERSION,
+            "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        count = 0
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for d in records: #one line at a time, the whole dataset is never turned into one big list
+                f.write(json.dumps(WeatherData.toDict(d)) + "\n")
+                count += 1
+        return count
+
+    @staticmethod
+    def readRecords(filename, offset=0):
+        #yields (entry, offset after the entry), passing that offset back in continues reading from there
+        with open(filename, "rb") as f:
+            if offset:
+                f.seek(offset)
+            else:
+                header = json.loads(f.readline())
+                if header.get("version", 1) > NdjsonWeatherFile.VERSION:
+                    raise ValueError(f"{filename} was saved by a newer version of the app")
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield json.loads(line), f.tell()
+
+class WeatherJournal: #append-only log of store changes, so a save only writes what changed since the last one
+    #not locked itself: the store calls the observer methods under its lock, other callers have to hold that lock too
+    def __init__(self, filename, batchSize=100):
+        self.filename = filename
+        self.batchSize = batchSize #changes are fsynced in batches, a crash loses at most the unflushed batch
+        WeatherJournal.dropTornTail(filename)
+        self.entries = WeatherJournal.countEntries(filename)
+        self._pending = []
+        self._file = open(filename, "a", encoding="utf-8")
+        self.onFlush = None #called after every flush, the app uses it to start a compaction
+
+    @staticmethod
+    def dropTornTail(filename):
+        #a crash in the middle of a write leaves half a line at the end, new entries must not be glued onto it
+        if not os.path.exists(filename):
+            return
+        with open(filename, "r+b") as f:
+            size = end = f.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end != size:
+                f.truncate(end)
+
+    @staticmethod
+    def countEntries(filename):
+        if not os.path.exists(filename):
+            return 0
+        with open(filename, "rb") as f:
+            return sum(1 for line in f if line.strip())
+
+    def _append(self, entry):
+        self._pending.append(json.dumps(entry) + "\n")
+        if len(self._pending) >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return 0
+        count = len(self._pending)
+        self._file.writelines(self._pending)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = []
+        self.entries += count
+        if self.onFlush:
+            self.onFlush(self)
+        return count
+
+    @property
+    def pendingCount(self):
+        return len(self._pending)
+
+    def rotate(self, rotated_filename):
+        #the current log is moved aside (for compaction) and a new empty one is started in its place
+        self.flush()
+        self._file.close()
+        os.replace(self.filename, rotated_filename)
+        self._file = open(self.filename, "a", encoding="utf-8")
+        self.entries = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    #store observer
+    def onAdd(self, data):
+        self._append({"op": "add", "data": WeatherData.toDict(data)})
+
+    def onUpdate(self, old, new):
+        self._append({"op": "update", "data": WeatherData.toDict(new)})
+
+    def onRemove(self, data):
+        self._append({"op": "delete", "city": data.city})
+
+    def onClear(self):
+        self._append({"op": "clear"})
+
+    @staticmethod
+    def replay(filename, store):
+        #every entry sets the final state of one city, so replaying a log over a newer base gives the same result
+        if not os.path.exists(filename):
+            return 0
+        applied = 0
+        with open(filename, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError: #a torn last line from a crash mid-write
+                    break
+                op = entry.get("op")
+                if op in ("add", "update"):
+                    data = WeatherData.fromDict(entry["data"])
+                    if not store.add(data):
+                        store.update(data.city, **{k: v for k, v in entry["data"].items() if k != "city"})
+                elif op == "delete":
+                    store.delete(entry["city"])
+                elif op == "clear":
+                    store.clear()
+                applied += 1
+        return applied
+
+class WeatherSnapshot: #binary snapshot: packed numeric columns + string tables, opened through mmap and decoded per row
+    MAGIC = b"WXSN"
+    VERSION = 1
+    #magic, version, reserved, rows, continent count, condition count, city blob, continent blob, condition blob, crc32
+    HEADER = struct.Struct("<4sHHQIIQIII")
+    HEADER_SIZE = 48 #HEADER padded so that every column starts 8 byte aligned
+
+    @staticmethod
+    def _pad(size):
+        return -size % 8
+
+    @staticmethod
+    def _stringTable(strings):
+        offsets = array("I", [0])
+        encoded = []
+        for value in strings:
+            data = value.encode("utf-8")
+            encoded.append(data)
+            offsets.append(offsets[-1] + len(data))
+        return offsets, b"".join(encoded)
+
+    @classmethod
+    def _layout(cls, rows, continent_count, condition_count, city_blob, continent_blob, condition_blob):
+        #(name, size) of every section in file order, each section is followed by padding up to 8 bytes
+        return [
+            ("temperature", rows * 8),
+            ("windSpeed", rows * 8),
+            ("humidity", rows * 8),
+            ("continentCodes", rows * 2),
+            ("conditionCodes", rows * 2),
+            ("cityOffsets", (rows + 1) * 4),
+            ("cityBlob", city_blob),
+            ("continentOffsets", (continent_count + 1) * 4),
+            ("continentBlob", continent_blob),
+            ("conditionOffsets", (condition_count + 1) * 4),
+            ("conditionBlob", condition_blob),
+        ]
+
+    @classmethod
+    def write(cls, filename, records):
+        if sys.byteorder != "little":
+            raise RuntimeError("Snapshots are stored little-endian and can only be written on little-endian machines")
+        table = records if isinstance(records, WeatherTable) else WeatherTable.fromRecords(records)
+        city_offsets, city_blob = cls._stringTable(table.cities)
+        continent_offsets, continent_blob = cls._stringTable(table.continents.values)
+        condition_offsets, condition_blob = cls._stringTable(table.conditions.values)
+        sections = [table.temperature.tobytes(), table.windSpeed.tobytes(), table.humidity.tobytes(),
+                    table.continentCodes.tobytes(), table.conditionCodes.tobytes(),
+                    city_offsets.tobytes(), city_blob, continent_offsets.tobytes(), continent_blob,
+                    condition_offsets.tobytes(), condition_blob]
+
+        checksum = 0
+        for section in sections:
+            checksum = zlib.crc32(section, checksum)
+            checksum = zlib.crc32(bytes(cls._pad(len(section))), checksum)
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, len(table), len(table.continents), len(table.conditions),
+                                 len(city_blob), len(continent_blob), len(condition_blob), checksum)
+        with open(filename, "wb") as f:
+            f.write(header.ljust(cls.HEADER_SIZE, b"\0"))
+            for section in sections:
+                f.write(section)
+                f.write(bytes(cls._pad(len(section))))
+        return len(table)
+
+    def __init__(self, filename, verify=True):
+        if sys.byteorder != "little":
+            raise RuntimeError("Snapshots are stored little-endian and can only be read on little-endian machines")
+        self._file = open(filename, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: #empty file
+            self._file.close()
+            raise ValueError(f"{filename} is not a weather snapshot")
+        try:
+            self._readHeader(filename, verify)
+        except Exception:
+            self.close()
+            raise
+
+    def _readHeader(self, filename, verify):
+        if len(self._map) < self.HEADER_SIZE:
+            raise ValueError(f"{filename} is not a weather snapshot")
+        (magic, version, _, rows, continent_count, condition_count,
+         city_blob, continent_blob, condition_blob, checksum) = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"{filename} is not a weather snapshot")
+        if version > self.VERSION:
+            raise ValueError(f"{filename} was saved by a newer version of the app")
+
+        view = memoryview(self._map)
+        self._views = [view]
+        sections = {}
+        position = self.HEADER_SIZE
+        for name, size in self._layout(rows, continent_count, condition_count, city_blob, continent_blob, condition_blob):
+            sections[name] = view[position:position + size]
+            self._views.append(sections[name])
+            position += size + self._pad(size)
+        if position > len(self._map):
+            raise ValueError(f"{filename} is truncated")
+        if verify and zlib.crc32(view[self.HEADER_SIZE:position]) != checksum:
+            raise ValueError(f"{filename} is corrupted (checksum mismatch)")
+
+        self.rows = rows
+        self.temperature = self._cast(sections["temperature"], "d")
+        self.windSpeed = self._cast(sections["windSpeed"], "d")
+        self.humidity = self._cast(sections["humidity"], "d")
+        self.continentCodes = self._cast(sections["continentCodes"], "H")
+        self.conditionCodes = self._cast(sections["conditionCodes"], "H")
+        self._cityOffsets = self._cast(sections["cityOffsets"], "I")
+        self._cityBlob = sections["cityBlob"]
+        #the interned tables are tiny, so they are decoded right away
+        self.continents = self._decodeAll(self._cast(sections["continentOffsets"], "I"), sections["continentBlob"])
+        self.conditions = self._decodeAll(self._cast(sections["conditionOffsets"], "I"), sections["conditionBlob"])
+
+    def _cast(self, section, typecode):
+        cast = section.cast(typecode)
+        self._views.append(cast)
+        return cast
+
+    @staticmethod
+    def _decodeAll(offsets, blob):
+        return [bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def city(self, row):
+        return bytes(self._cityBlob[self._cityOffsets[row]:self._cityOffsets[row + 1]]).decode("utf-8")
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.rows
+        if not 0 <= row < self.rows:
+            raise IndexError("snapshot row out of range")
+        return WeatherData(self.city(row), self.continents[self.continentCodes[row]],
+                           _tableNumber(self.temperature[row]), self.conditions[self.conditionCodes[row]],
+                           _tableNumber(self.windSpeed[row]), _tableNumber(self.humidity[row]))
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self[row]
+
+    def close(self):
+        for view in reversed(getattr(self, "_views", [])): #the map can only be closed once nothing points into it
+            view.release()
+        self._views = []
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class WeatherServer: #asyncio http/json front end, start with: python main.py serve [host] [port]
+    NUMERIC_FIELDS = ("temperature", "windSpeed", "humidity")
+
+    def __init__(self, app, host="127.0.0.1", port=8080, maxBodyBytes=10 * 2**20):
+        import asyncio #only once a server is made, plain runs of main.py don't load it
+        self.asyncio = asyncio
+        self.app = app
+        self.host = host
+        self.port = port
+        self.maxBodyBytes = maxBodyBytes #bigger bodies get a 413 before anything is read, a client can't make us buffer gigabytes
+        self._server = None
+        self._appLock = threading.Lock() #forecasts, imports etc. aren't thread safe, those executor jobs take turns on it
+        self._routes = [
+            ("GET", re.compile(r"^/cities$"), self._listCities),
+            ("POST", re.compile(r"^/cities$"), self._addCities),
+            ("PATCH", re.compile(r"^/cities$"), self._updateCities),
+            ("DELETE", re.compile(r"^/cities$"), self._deleteCities),
+            ("GET", re.compile(r"^/cities/(?P<city>[^/]+)$"), self._getCity),
+            ("PATCH", re.compile(r"^/cities/(?P<city>[^/]+)$"), self._updateCity),
+            ("DELETE", re.compile(r"^/cities/(?P<city>[^/]+)$"), self._deleteCity),
+            ("GET", re.compile(r"^/forecast/(?P<city>[^/]+)$"), self._forecast),
+            ("POST", re.compile(r"^/forecast$"), self._bulkForecast),
+            ("GET", re.compile(r"^/alerts$"), self._allAlerts),
+            ("GET", re.compile(r"^/alerts/(?P<city>[^/]+)$"), self._cityAlerts),
+            ("GET", re.compile(r"^/report$"), self._report),
+        ]
+        #these only read records and aggregates, the store gives them a consistent view without waiting for writers
+        self._snapshotReads = {self._listCities, self._getCity, self._allAlerts, self._cityAlerts, self._report}
+
+    async def start(self):
+        self._server = await self.asyncio.start_server(self._handleClient, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1] #port 0 means "pick a free one"
+        return self
+
+    async def serveForever(self):
+        if self._server is None:
+            await self.start()
+        print(f"Serving weather data on http://{self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handleClient(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline() #a line over the stream limit is a ValueError too
+                    if not request_line.strip():
+                        break
+                    method, target, version = request_line.decode("latin-1").strip().split(" ")
+                    if not version.startswith("HTTP/"):
+                        raise ValueError(version)
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, sep, value = line.decode("latin-1").partition(":")
+                        if not sep:
+                            raise ValueError(line)
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get("content-length", 0) or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError: #answer instead of just hanging up, then close since the stream can't be trusted
+                    self._writeResponse(writer, 400, {"error": "Malformed HTTP request"}, False)
+                    await writer.drain()
+                    break
+                if length > self.maxBodyBytes:
+                    self._writeResponse(writer, 413, {"error": f"Body is over {self.maxBodyBytes} bytes"}, False)
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length)
+                status, payload = await self._dispatch(method.upper(), target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self._writeResponse(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, self.asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _writeResponse(writer, status, payload, keep_alive):
+        reasons = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                   413: "Payload Too Large", 500: "Internal Server Error"}
+        body = json.dumps(payload).encode("utf-8")
+        writer.write((f"HTTP/1.1 {status} {reasons.get(status, 'OK')}\r\n"
+                      f"Content-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + body)
+
+    async def _dispatch(self, method, target, body):
+        import urllib.parse
+        url = urllib.parse.urlsplit(target)
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        try:
+            data = json.loads(body) if body.strip() else None
+        except ValueError:
+            return 400, {"error": "Request body is not valid JSON"}
+        path_found = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            path_found = True
+            if route_method != method:
+                continue
+            args = {k: urllib.parse.unquote(v) for k, v in match.groupdict().items()}
+            loop = self.asyncio.get_running_loop()
+            try: #every app access runs in the executor so slow forecasts/reports never block the event loop
+                return await loop.run_in_executor(None, self._locked, handler, data, query, args)
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            except Exception as e:
+                return 500, {"error": f"{type(e).__name__}: {e}"}
+        if path_found:
+            return 405, {"error": f"{method} is not allowed on {url.path}"}
+        return 404, {"error": f"No endpoint {url.path}"}
+
+    def _locked(self, handler, data, query, args):
+        if handler in self._snapshotReads:
+            return handler(data, query, **args)
+        with self._appLock:
+            return handler(data, query, **args)
+
+    @classmethod
+    def _checkFields(cls, entry, required):
+        if not isinstance(entry, dict):
+            raise ValueError("Each city must be a JSON object")
+        missing = [field for field in required if field not in entry]
+        if missing:
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+        for field in cls.NUMERIC_FIELDS:
+            if field in entry and (isinstance(entry[field], bool) or not isinstance(entry[field], (int, float))):
+                raise ValueError(f"{field} must be a number")
+        return entry
+
+    @staticmethod
+    def _asList(data):
+        return data if isinstance(data, list) else [data]
+
+    def _listCities(self, data, query):
+        return 200, {"cities": [WeatherData.toDict(d) for d in self.app.weatherDataList]}
+
+    def _getCity(self, data, query, city):
+        found = self.app.weatherDataList.get(city)
+        if not found:
+            return 404, {"error": f"City '{city}' not found"}
+        return 200, WeatherData.toDict(found)
+
+    def _addCities(self, data, query):
+        errors, valid = [], [] #same checks and response as before bulk_add: names added, duplicates, errors by index
+        for i, entry in enumerate(self._asList(data)):
+            try:
+                valid.append((i, self._checkFields(entry, WeatherData.__slots__)))
+            except ValueError as e:
+                errors.append({"index": i, "error": str(e)})
+        result = self.app.bulk_add([entry for _, entry in valid])
+        errors += [{"index": valid[i][0], "error": error} for i, error in result.errors]
+        skipped = {i for i, _ in result.duplicates} | {i for i, _ in result.errors}
+        added = [entry["city"] for i, (_, entry) in enumerate(valid) if i not in skipped]
+        return (201 if added else 200), {
+            "added": added,
+            "duplicates": [city for _, city in result.duplicates],
+            "errors": sorted(errors, key=lambda e: e["index"]),
+        }
+
+    def _applyUpdate(self, city, changes):
+        self._checkFields(changes, ())
+        changes = {k: v for k, v in changes.items() if k in ("temperature", "condition", "windSpeed", "humidity")}
+        return self.app.weatherDataList.update(city, **changes)
+
+    def _updateCity(self, data, query, city):
+        updated = self._applyUpdate(city, data or {})
+        if not updated:
+            return 404, {"error": f"City '{city}' not found"}
+        return 200, WeatherData.toDict(updated)
+
+    def _updateCities(self, data, query): #body: [{"city": ..., "temperature": ...}, ...]
+        updated, missing = [], []
+        for entry in self._asList(data):
+            self._checkFields(entry, ("city",))
+            (updated if self._applyUpdate(entry["city"], entry) else missing).append(entry["city"])
+        return 200, {"updated": updated, "notFound": missing}
+
+    def _deleteCity(self, data, query, city):
+        if not self.app.weatherDataList.delete(city):
+            return 404, {"error": f"City '{city}' not found"}
+        return 200, {"deleted": [city]}
+
+    def _deleteCities(self, data, query): #body: ["Tokyo", "Paris", ...]
+        deleted, missing = [], []
+        for city in self._asList(data):
+            (deleted if self.app.weatherDataList.delete(str(city)) else missing).append(city)
+        return 200, {"deleted": deleted, "notFound": missing}
+
+    @staticmethod
+    def _forecastPayload(forecast):
+        analyzer = ForecastAnalyzer(forecast)
+        return {
+            "hours": [{"hour": i, "temperature": f.temperature, "condition": f.condition,
+                       "windSpeed": f.windSpeed, "humidity": f.humidity} for i, f in enumerate(forecast)],
+            "summary": {"maxTemperature": analyzer.getMaxTemperature(), "minTemperature": analyzer.getMinTemperature(),
+                        "dominantCondition": analyzer.getDominantCondition()},
+        }
+
+    def _forecast(self, data, query, city):
+        forecast = self.app.hourlyForecasts.get(CityStore.cityKey(city))
+        if forecast is None:
+            return 404, {"error": f"City '{city}' not found"}
+        return 200, {"city": city, **self._forecastPayload(forecast)}
+
+    def _bulkForecast(self, data, query): #body: {"seed": 1, "hours": 24} for all cities, or {"cities": [...]} for some
+        data = data or {}
+        if not isinstance(data, dict):
+            raise ValueError("Body must be a JSON object")
+        if "cities" in data:
+            results = {}
+            for city in self._asList(data["cities"]):
+                forecast = self.app.hourlyForecasts.get(CityStore.cityKey(str(city)))
+                if forecast is not None:
+                    results[city] = self._forecastPayload(forecast)["summary"]
+            return 200, {"forecasts": results}
+        matrix = self.app.generateAllHourlyForecasts(seed=data.get("seed"), hours=int(data.get("hours", 24)))
+        return 200, {"forecasts": {key: self._forecastPayload(matrix.forCity(key))["summary"] for key in matrix.startRows}}
+
+    def _allAlerts(self, data, query):
+        results = self.app.alert_handler.evaluate_all(self.app.weatherDataList)
+        return 200, {"alerts": {d.city: alerts for d, alerts in results}}
+
+    def _cityAlerts(self, data, query, city):
+        found = self.app.weatherDataList.get(city)
+        if not found:
+            return 404, {"error": f"City '{city}' not found"}
+        return 200, {"city": found.city, "alerts": self.app.alert_handler.get_alerts(found)}
+
+    def _report(self, data, query):
+        return 200, {"continents": self.app.getContinentStats()}
+
+class BatchRunner: #scripted mode without the menu: python main.py batch [file], one command per line, stdin by default
+    #lines are json ({"op": "add", "city": "Oslo", ...}) or cli style (add Oslo Europe 5 Cloudy 10 80), the output is
+    #one json result per command. a run of adds becomes one bulk_add, "forecast all" and "alerts all" one bulk pass
+    ADD_FIELDS = ("city", "continent", "temperature", "condition", "windSpeed", "humidity")
+    UPDATE_FIELDS = ("temperature", "condition", "windSpeed", "humidity")
+    FLUSH_EVERY = 1000 #results written to the output at once
+
+    def __init__(self, app, out=None):
+        self.app = app
+        self.out = out if out is not None else sys.stdout
+        self._pending = []
+        self.failures = 0
+        self._commands = {"update": self._update, "delete": self._delete, "get": self._get, "list": self._list,
+                          "forecast": self._forecast, "alerts": self._alerts, "report": self._report,
+                          "search": self._search, "save": self._save, "load": self._load}
+
+    @classmethod
+    def parse(cls, line):
+        #-> (op, params), None for blank lines and # comments
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return None
+        if line.startswith("{"):
+            params = json.loads(line)
+            if not isinstance(params, dict) or not isinstance(params.get("op"), str):
+                raise ValueError('A json command needs an "op"')
+            params = dict(params)
+            return params.pop("op").casefold(), params
+        import shlex
+        words = shlex.split(line)
+        op, args = words[0].casefold(), words[1:]
+        options = dict(arg.split("=", 1) for arg in args if "=" in arg) #update Oslo temperature=3 humidity=90
+        args = [arg for arg in args if "=" not in arg]
+        if op == "add":
+            if len(args) != len(cls.ADD_FIELDS):
+                raise ValueError(f"add needs {' '.join(cls.ADD_FIELDS)}")
+            return op, dict(zip(cls.ADD_FIELDS, args))
+        key = {"search": "query", "save": "file", "load": "file"}.get(op, "city")
+        if args:
+            options[key] = " ".join(args) #lets "get New York" work without quotes
+        return op, options
+
+    def run(self, lines):
+        import contextlib
+        adds = [] #(line number, params) of the adds waiting to go in as one bulk_add
+        try:
+            with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet): #the app's own prints aren't the output
+                for number, line in enumerate(lines, 1):
+                    try:
+                        command = self.parse(line)
+                    except ValueError as e: #json errors are ValueErrors too
+                        self._flushAdds(adds)
+                        self._emit(number, None, error=str(e))
+                        continue
+                    if command is None:
+                        continue
+                    op, params = command
+                    if op == "add":
+                        adds.append((number, params))
+                        continue
+                    self._flushAdds(adds)
+                    handler = self._commands.get(op)
+                    if handler is None:
+                        self._emit(number, op, error=f"Unknown command '{op}'")
+                        continue
+                    try:
+                        self._emit(number, op, handler(params))
+                    except (ValueError, TypeError, OSError) as e:
+                        self._emit(number, op, error=str(e))
+                    except Exception as e: #a bug in one command fails its line, not the rest of the batch
+                        self._emit(number, op, error=f"{type(e).__name__}: {e}")
+                self._flushAdds(adds)
+        finally: #whatever happens, the results of the lines that did run are written
+            self._write()
+        return self.failures
+
+    def _emit(self, number, op, result=None, error=None):
+        if error is None:
+            self._pending.append(json.dumps({"line": number, "op": op, "ok": True, **result}, ensure_ascii=False))
+        else:
+            self.failures += 1
+            self._pending.append(json.dumps({"line": number, "op": op, "ok": False, "error": error}, ensure_ascii=False))
+        if len(self._pending) >= self.FLUSH_EVERY:
+            self._write()
+
+    def _write(self):
+        if self._pending:
+            self.out.write("\n".join(self._pending) + "\n")
+            self._pending = []
+        self.out.flush()
+
+    def _flushAdds(self, adds):
+        if not adds:
+            return
+        result = self.app.bulk_add([params for _, params in adds])
+        problems = {i: f"Invalid entry: {error}" for i, error in result.errors}
+        problems.update((i, f"City '{city}' already exists") for i, city in result.duplicates)
+        for i, (number, params) in enumerate(adds):
+            if i in problems:
+                self._emit(number, "add", error=problems[i])
+            else:
+                self._emit(number, "add", {"city": params["city"]})
+        adds.clear()
+
+    def _find(self, params):
+        city = params.get("city")
+        if not city:
+            raise ValueError("Missing city")
+        data = self.app.findCity(str(city))
+        if data is None:
+            raise ValueError(f"City '{city}' not found")
+        return data
+
+    def _update(self, params):
+        data = self._find(params)
+        changes = {}
+        for field in self.UPDATE_FIELDS:
+            if field in params:
+                changes[field] = str(params[field]) if field == "condition" else WeatherApp._toNumber(params[field], field)
+        unknown = set(params) - set(self.UPDATE_FIELDS) - {"city"}
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return WeatherData.toDict(self.app.weatherDataList.update(data.city, **changes))
+
+    def _delete(self, params):
+        data = self._find(params)
+        self.app.weatherDataList.delete(data.city)
+        return {"city": data.city}
+
+    def _get(self, params):
+        return WeatherData.toDict(self._find(params))
+
+    def _list(self, params):
+        return {"cities": [WeatherData.toDict(d) for d in self.app.weatherDataList.snapshot()]}
+
+    def _forecast(self, params):
+        if str(params.get("city", "")).casefold() == "all": #one forecast matrix pass instead of a city at a time
+            seed = params.get("seed")
+            matrix = self.app.generateAllHourlyForecasts(seed=int(seed) if seed is not None else None,
+                                                         hours=int(params.get("hours", 24)))
+            forecasts = [matrix.forCity(key) for key in matrix.startRows]
+            return {"forecasts": {f[0].city: WeatherServer._forecastPayload(f)["summary"] for f in forecasts if f}}
+        data = self._find(params)
+        if "seed" in params:
+            self.app.generateHourlyForecast(data.city, int(params["seed"]))
+        forecast = self.app.hourlyForecasts.get(CityStore.cityKey(data.city))
+        return {"city": data.city, **WeatherServer._forecastPayload(forecast)}
+
+    def _alerts(self, params):
+        if str(params.get("city", "")).casefold() == "all": #all the rules as column masks in one go
+            results = self.app.alert_handler.evaluate_all(self.app.weatherDataList.snapshot())
+            return {"alerts": {d.city: alerts for d, alerts in results}}
+        data = self._find(params)
+        return {"city": data.city, "alerts": self.app.alert_handler.get_alerts(data)}
+
+    def _report(self, params):
+        return {"continents": self.app.getContinentStats()}
+
+    def _search(self, params):
+        if not params.get("query"):
+            raise ValueError("Missing query")
+        results = self.app.searchCities(str(params["query"]), int(params.get("limit", 10)))
+        return {"cities": [d.city for d in results]}
+
+    def _save(self, params):
+        filename = params.get("file", "weather_data.json")
+        self.app.saveDataToFile(filename)
+        return {"file": filename, "cities": len(self.app.weatherDataList)}
+
+    def _load(self, params):
+        filename = params.get("file", "weather_data.json")
+        if not os.path.exists(filename):
+            raise ValueError(f"No save data file {filename}")
+        self.app.loadDataFromFile(filename)
+        return {"file": filename, "cities": len(self.app.weatherDataList)}
+
+class WeatherBenchmarks: #run with: python main.py bench <name> [args]
+    @staticmethod
+    def syntheticRecords(count, seed=0):
+        rng = random.Random(seed)
+        continents = ["Asia", "Europe", "Africa", "North America", "South America", "Australia"]
+        conditions = ["Sunny", "Cloudy", "Rainy", "Stormy", "Snowy"]
+        for i in range(count):
+            yield (f"City{i}", rng.choice(continents), rng.randint(-20, 45), rng.choice(conditions),
+                   rng.randint(0, 60), rng.randint(0, 100))
+
+    @staticmethod
+    def benchmarkMemory(rows=10**6):
+        import tracemalloc
+        names = [r[0] for r in WeatherBenchmarks.syntheticRecords(rows)] #names are shared by both layouts so only the layout is measured
+        records = list(WeatherBenchmarks.syntheticRecords(rows))
+
+        tracemalloc.start()
+        objects = [WeatherData(names[i], r[1], r[2], r[3], r[4], r[5]) for i, r in enumerate(records)]
+        object_bytes = tracemalloc.get_traced_memory()[0]
+        del objects
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        table = WeatherTable()
+        for i, r in enumerate(records):
+            table.append(names[i], r[1], r[2], r[3], r[4], r[5])
+        table_bytes = tracemalloc.get_traced_memory()[0]
+        del table
+        tracemalloc.stop()
+
+        return {
+            "rows": rows,
+            "objectBytes": object_bytes,
+            "tableBytes": table_bytes,
+            "savedRatio": 1 - table_bytes / object_bytes if object_bytes else 0.0,
+        }
+
+    @staticmethod
+    def _rssBytes(): #current resident set size, only available where /proc exists
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def _measure(function):
+        import tracemalloc
+        rss_before = WeatherBenchmarks._rssBytes()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rss_after = WeatherBenchmarks._rssBytes()
+        rss = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        return result, {"seconds": seconds, "peakBytes": peak, "rssDeltaBytes": rss}
+
+    @staticmethod
+    def benchmarkSnapshot(rows=10**5):
+        import tempfile
+        records = [WeatherData(*r) for r in WeatherBenchmarks.syntheticRecords(rows)]
+        results = {"rows": rows}
+        with tempfile.TemporaryDirectory() as tmp:
+            json_file = os.path.join(tmp, "weather.json")
+            snapshot_file = os.path.join(tmp, "weather.snap")
+            with open(json_file, "w") as f:
+                json.dump({"saved_at": "", "data": [WeatherData.toDict(d) for d in records]}, f)
+            WeatherSnapshot.write(snapshot_file, records)
+            del records
+
+            def openSnapshot():
+                snapshot = WeatherSnapshot(snapshot_file)
+                snapshot[len(snapshot) // 2] #touch one row, the rest stays on disk until it is needed
+                return snapshot
+
+            def scanSnapshot():
+                with WeatherSnapshot(snapshot_file) as snapshot:
+                    return sum(1 for _ in snapshot)
+
+            def loadJson():
+                with open(json_file) as f:
+                    return [WeatherData.fromDict(entry) for entry in json.load(f)["data"]]
+
+            snapshot, results["snapshotOpen"] = WeatherBenchmarks._measure(openSnapshot)
+            snapshot.close()
+            _, results["snapshotFullScan"] = WeatherBenchmarks._measure(scanSnapshot)
+            _, results["jsonLoad"] = WeatherBenchmarks._measure(loadJson)
+            results["jsonBytes"] = os.path.getsize(json_file)
+            results["snapshotBytes"] = os.path.getsize(snapshot_file)
+        return results
+
+    SUITE_SIZES = (10**3, 10**4, 10**5, 10**6)
+
+    @staticmethod
+    def _percentile(sorted_values, p):
+        if not sorted_values:
+            return 0.0
+        return sorted_values[max(0, -(-p * len(sorted_values) // 100) - 1)]
+
+    @staticmethod
+    def _summarize(latencies_ns, records, total_ns=None):
+        latencies_ns = sorted(latencies_ns)
+        total_ns = total_ns if total_ns is not None else sum(latencies_ns)
+        pct = WeatherBenchmarks._percentile
+        return {
+            "calls": len(latencies_ns),
+            "records": records,
+            "seconds": total_ns / 1e9,
+            "throughput": records / (total_ns / 1e9) if total_ns else 0.0,
+            "p50Ms": pct(latencies_ns, 50) / 1e6,
+            "p95Ms": pct(latencies_ns, 95) / 1e6,
+            "p99Ms": pct(latencies_ns, 99) / 1e6,
+        }
+
+    @staticmethod
+    def _suiteOperations(app, records, workdir, samples):
+        #(name, setup, step, calls, records per call), a step is timed call by call so percentiles can be reported
+        cities = [r[0] for r in records[:samples]]
+        add_rows = iter(records)
+        forecasts = {}
+        json_file = os.path.join(workdir, "bench.json")
+        ndjson_file = os.path.join(workdir, "bench.ndjson")
+
+        def analyze(city):
+            forecast = forecasts.get(city)
+            if forecast is None:
+                forecast = forecasts[city] = app.hourlyForecasts[CityStore.cityKey(city)]
+            ForecastAnalyzer(forecast).printForecastAnalysis()
+
+        handler = app.alert_handler
+        return [
+            ("addWeatherData", lambda: next(add_rows), lambda row: app.addWeatherData(*row), len(records), 1),
+            ("generateHourlyForecast", None, lambda i: app.generateHourlyForecast(cities[i % len(cities)]), samples, 24),
+            ("generateAllHourlyForecasts", None, lambda i: app.generateAllHourlyForecasts(seed=i), 1, 24 * len(records)),
+            ("generateReport", None, lambda i: app.generateReport(), samples, len(records)),
+            ("get_alerts", None, lambda i: handler.get_alerts(app.weatherDataList.get(cities[i % len(cities)])), samples, 1),
+            ("evaluate_all", None, lambda i: handler.evaluate_all(app.weatherDataList), 1, len(records)),
+            ("ForecastAnalyzer", None, lambda i: analyze(cities[i % len(cities)]), samples, 24),
+            ("saveDataToFile", None, lambda i: app.saveDataToFile(json_file), 1, len(records)),
+            ("loadDataFromFile", None, lambda i: app.loadDataFromFile(json_file), 1, len(records)),
+            ("saveDataToFile.ndjson", None, lambda i: app.saveDataToFile(ndjson_file), 1, len(records)),
+            ("loadDataFromFile.ndjson", None, lambda i: app.loadDataFromFile(ndjson_file), 1, len(records)),
+        ]
+
+    @staticmethod
+    def runSuite(sizes=SUITE_SIZES, samples=1000, trackMemory=True):
+        import contextlib
+        import platform
+        import tempfile
+        import tracemalloc
+
+        results = {}
+        for size in sizes:
+            records = list(WeatherBenchmarks.syntheticRecords(size))
+            size_results = results[str(size)] = {}
+            with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                for traced in ((False, True) if trackMemory else (False,)):
+                    app = WeatherApp() #a fresh app for each pass, so the adds really insert and the memory pass repeats the same work
+                    app.weatherDataList.clear()
+                    app.hourlyForecasts.maxEntries = None
+                    if traced:
+                        tracemalloc.start()
+                    for name, setup, step, calls, per_call in WeatherBenchmarks._suiteOperations(app, records, tmp, samples):
+                        if traced:
+                            tracemalloc.reset_peak()
+                        latencies = []
+                        started = time.perf_counter_ns()
+                        for i in range(calls):
+                            arg = setup() if setup else i
+                            t0 = time.perf_counter_ns()
+                            step(arg)
+                            latencies.append(time.perf_counter_ns() - t0)
+                        if traced:
+                            size_results[name]["peakBytes"] = tracemalloc.get_traced_memory()[1]
+                        else:
+                            size_results[name] = WeatherBenchmarks._summarize(latencies, calls * per_call,
+                                                                              time.perf_counter_ns() - started)
+                    if traced:
+                        tracemalloc.stop()
+        return {
+            "version": 1,
+            "createdAt": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "samples": samples,
+            "results": results,
+        }
+
+    @staticmethod
+    def compareResults(current, baseline, tolerance=0.2):
+        #regressions: throughput down or p95 latency up by more than 'tolerance' on a size/operation both runs have
+        regressions = []
+        for size, operations in current["results"].items():
+            for name, now in operations.items():
+                before = baseline.get("results", {}).get(size, {}).get(name)
+                if not before:
+                    continue
+                if before["throughput"] and now["throughput"] < before["throughput"] * (1 - tolerance):
+                    regressions.append(f"{name} @ {size}: throughput {before['throughput']:.0f} -> {now['throughput']:.0f} rec/s")
+                if before["p95Ms"] and now["p95Ms"] > before["p95Ms"] * (1 + tolerance):
+                    regressions.append(f"{name} @ {size}: p95 {before['p95Ms']:.3f} -> {now['p95Ms']:.3f} ms")
+        return regressions
+
+    @staticmethod
+    def _suiteMain(args):
+        sizes, output, baseline, samples, track_memory = WeatherBenchmarks.SUITE_SIZES, "bench_results.json", None, 1000, True
+        i = 0
+        while i < len(args):
+            if args[i] == "--sizes":
+                sizes = [int(float(size)) for size in args[i + 1].split(",")]
+            elif args[i] == "--output":
+                output = args[i + 1]
+            elif args[i] == "--baseline":
+                baseline = args[i + 1]
+            elif args[i] == "--samples":
+                samples = int(args[i + 1])
+            elif args[i] == "--no-memory":
+                track_memory = False
+                i -= 1
+            else:
+                print(f"Unknown option '{args[i]}'.")
+                return 2
+            i += 2
+
+        report = WeatherBenchmarks.runSuite(sizes, samples, track_memory)
+        for size, operations in report["results"].items():
+            print(f"\n{size} cities")
+            for name, m in operations.items():
+                peak = f", peak {m['peakBytes'] / 2**20:.1f} MiB" if "peakBytes" in m else ""
+                print(f"  {name:26} {m['throughput']:>14,.0f} rec/s  p50 {m['p50Ms']:.3f} ms  "
+                      f"p95 {m['p95Ms']:.3f} ms  p99 {m['p99Ms']:.3f} ms{peak}")
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {output}")
+
+        if baseline:
+            with open(baseline) as f:
+                regressions = WeatherBenchmarks.compareResults(report, json.load(f))
+            for line in regressions:
+                print(f"REGRESSION {line}")
+            return 1 if regressions else 0
+        return 0
+
+    STARTUP_BUDGET_SECONDS = 0.3 #import + one WeatherApp() in a fresh interpreter
+
+    @staticmethod
+    def benchmarkStartup(runs=5, instances=1000):
+        import subprocess
+        script = ("import time; t = time.perf_counter(); import main; main.WeatherApp(); "
+                  "print(time.perf_counter() - t)")
+        directory = os.path.dirname(os.path.abspath(__file__))
+        cold = []
+        for _ in range(runs): #a new interpreter every time, so the import is really measured
+            output = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True, text=True, check=True)
+            cold.append(float(output.stdout.split()[-1]))
+        start = time.perf_counter()
+        for _ in range(instances):
+            WeatherApp()
+        construct = (time.perf_counter() - start) / instances
+        return {
+            "importAndConstructSeconds": sorted(cold)[len(cold) // 2],
+            "constructSeconds": construct,
+            "budgetSeconds": WeatherBenchmarks.STARTUP_BUDGET_SECONDS,
+        }
+
+    @staticmethod
+    def benchmarkIndexes(rows=10**5, queries=200, k=10):
+        app = WeatherApp(defaultCities=False)
+        app.bulk_add(WeatherBenchmarks.syntheticRecords(rows))
+        rng = random.Random(1)
+        continents = list(app.continentStats.continents)
+        plans = [(rng.choice(CityIndexes.FIELDS), rng.choice(continents + [None]), rng.randint(0, 50)) for _ in range(queries)]
+
+        start = time.perf_counter()
+        app._cityIndexes()
+        build = time.perf_counter() - start
+
+        def naiveTop(field, continent):
+            cities = [d for d in app.weatherDataList if continent is None or d.continent == continent]
+            return sorted(cities, key=lambda d: getattr(d, field), reverse=True)[:k]
+
+        def naiveRange(field, continent, low):
+            return [d for d in app.weatherDataList
+                    if (continent is None or d.continent == continent) and low <= getattr(d, field) <= low + 5]
+
+        timings = {}
+        for name, run in (("indexedTopK", lambda p: app.topCities(p[0], k, p[1])),
+                          ("naiveTopK", lambda p: naiveTop(p[0], p[1])),
+                          ("indexedRange", lambda p: app.citiesInRange(p[0], p[2], p[2] + 5, p[1])),
+                          ("naiveRange", lambda p: naiveRange(p[0], p[1], p[2]))):
+            start = time.perf_counter()
+            for plan in plans:
+                run(plan)
+            timings[name] = (time.perf_counter() - start) / queries
+        return {"rows": rows, "queries": queries, "indexBuildSeconds": build, "secondsPerQuery": timings}
+
+    @staticmethod
+    def benchmarkSearch(rows=10**6, queries=200):
+        rng = random.Random(2)
+        #made up names with roughly the spread of real place names: clusters, codas, accents and a few two word names
+        onsets = list("bcdfghjklmnprstvwyz") + ["br", "ch", "cr", "dr", "fr", "gr", "kr", "pl", "sh", "st", "th", "tr", "qu"]
+        vowels = list("aeiouy") + ["á", "é", "í", "ó", "ü", "ai", "au", "ea", "ie", "ou"]
+        codas = [""] * 6 + list("lmnrstxz") + ["ng", "rd", "nd", "rg", "ck", "ll", "ss"]
+        syllables = [o + v + c for o in onsets for v in vowels for c in codas]
+        names = set()
+        while len(names) < rows:
+            name = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).title()
+            if rng.random() < 0.15:
+                name = rng.choice(["San ", "Port ", "New ", "Santa ", "Bad "]) + name
+            names.add(name)
+        records = [WeatherData(name, "Continent", 20, "Sunny", 10, 50) for name in names]
+        start = time.perf_counter()
+        index = CitySearchIndex(records)
+        index.buildFuzzy()
+        build = time.perf_counter() - start
+
+        samples = [rng.choice(records).city for _ in range(queries)]
+        typos = []
+        for name in samples:
+            i = rng.randrange(len(name))
+            typos.append(name[:i] + name[i + 1:]) #one dropped character
+        timings = {}
+        for label, run in (("prefix", lambda q: index.prefix(q[:4])), ("exact", index.exact), ("fuzzy", index.fuzzy)):
+            inputs = typos if label == "fuzzy" else samples
+            start = time.perf_counter()
+            for query in inputs:
+                run(query)
+            timings[label] = (time.perf_counter() - start) / queries
+        return {"names": len(records), "buildSeconds": build, "secondsPerQuery": timings}
+
+    @staticmethod
+    def benchmarkConcurrency(readers=4, writers=4, seconds=2.0, cities=2 * 10**5):
+        #writers keep temperature == humidity on every city and add/delete their own churn cities, readers check
+        #that every snapshot they get is one whole state: no half updated city, no city twice, versions never going back
+        app = WeatherApp(defaultCities=False)
+        app.bulk_add([WeatherData(f"City {i}", f"Continent {i % 7}", 50, "Sunny", 10, 50) for i in range(cities)])
+        store = app.weatherDataList
+        stop = threading.Event()
+        reads, snapshotReads, writes, violations = [0] * readers, [0] * readers, [0] * writers, []
+
+        def reader(n):
+            last = -1
+            while not stop.is_set():
+                snapshot = store.snapshot()
+                if snapshot.version < last:
+                    violations.append(f"version went back from {last} to {snapshot.version}")
+                last = snapshot.version
+                if len({CityStore.cityKey(d.city) for d in snapshot}) != len(snapshot):
+                    violations.append("city listed twice")
+                for data in snapshot:
+                    if data.temperature != data.humidity:
+                        violations.append(f"half updated {data.city}")
+                        break
+                snapshotReads[n] += 1
+                reads[n] += len(snapshot)
+
+        def writer(n):
+            rng = random.Random(n)
+            churn = []
+            while not stop.is_set():
+                value = rng.randint(0, 100)
+                store.update(f"City {rng.randrange(cities)}", temperature=value, humidity=value)
+                if churn and rng.random() < 0.5:
+                    store.delete(churn.pop())
+                else:
+                    churn.append(f"Churn {n}-{writes[n]}")
+                    store.add(WeatherData(churn[-1], f"Continent {n % 7}", value, "Rainy", 5, value))
+                writes[n] += 2
+
+        def guarded(work, n): #a thread dying on e.g. "dictionary changed size during iteration" counts as a violation
+            try:
+                work(n)
+            except Exception as e:
+                violations.append(f"{type(e).__name__}: {e}")
+
+        threads = [threading.Thread(target=guarded, args=(reader, n)) for n in range(readers)]
+        threads += [threading.Thread(target=guarded, args=(writer, n)) for n in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        #a write followed by a read has to stay cheap on a big store, no full copy per snapshot
+        pairs = 200
+        start = time.perf_counter()
+        for i in range(pairs):
+            store.update(f"City {i % cities}", temperature=i % 100, humidity=i % 100)
+            next(iter(store.snapshot()), None)
+        pairSeconds = (time.perf_counter() - start) / pairs
+        return {"app": app, "violations": violations, "snapshots": sum(snapshotReads), "writes": sum(writes),
+                "recordReadsPerSecond": sum(reads) / elapsed, "writesPerSecond": sum(writes) / elapsed,
+                "writeReadPairSeconds": pairSeconds}
+
+    @staticmethod
+    def run(args):
+        name = args[0] if args else "memory"
+        if name == "memory":
+            rows = int(args[1]) if len(args) > 1 else 10**6
+            result = WeatherBenchmarks.benchmarkMemory(rows)
+            print(f"{result['rows']} rows: objects {result['objectBytes'] / 2**20:.1f} MiB, "
+                  f"table {result['tableBytes'] / 2**20:.1f} MiB ({result['savedRatio']:.0%} saved)")
+        elif name == "snapshot":
+            rows = int(args[1]) if len(args) > 1 else 10**5
+            result = WeatherBenchmarks.benchmarkSnapshot(rows)
+            print(f"{rows} rows, json {result['jsonBytes'] / 2**20:.1f} MiB, snapshot {result['snapshotBytes'] / 2**20:.1f} MiB")
+            for phase in ("jsonLoad", "snapshotOpen", "snapshotFullScan"):
+                m = result[phase]
+                rss = f"{m['rssDeltaBytes'] / 2**20:.1f} MiB" if m["rssDeltaBytes"] is not None else "n/a"
+                print(f"  {phase}: {m['seconds'] * 1000:.1f} ms, peak alloc {m['peakBytes'] / 2**20:.1f} MiB, rss +{rss}")
+        elif name == "startup":
+            result = WeatherBenchmarks.benchmarkStartup()
+            print(f"import + construct: {result['importAndConstructSeconds'] * 1000:.1f} ms "
+                  f"(budget {result['budgetSeconds'] * 1000:.0f} ms), construct only: {result['constructSeconds'] * 1e6:.1f} µs")
+            return 0 if result["importAndConstructSeconds"] <= result["budgetSeconds"] else 1
+        elif name == "indexes":
+            rows = int(args[1]) if len(args) > 1 else 10**5
+            result = WeatherBenchmarks.benchmarkIndexes(rows)
+            print(f"{rows} rows, index build {result['indexBuildSeconds'] * 1000:.1f} ms")
+            for query, seconds in result["secondsPerQuery"].items():
+                print(f"  {query}: {seconds * 1000:.3f} ms/query")
+        elif name == "search":
+            rows = int(args[1]) if len(args) > 1 else 10**6
+            result = WeatherBenchmarks.benchmarkSearch(rows)
+            print(f"{result['names']} names, index build {result['buildSeconds']:.1f} s")
+            for query, seconds in result["secondsPerQuery"].items():
+                print(f"  {query}: {seconds * 1000:.3f} ms/query")
+        elif name == "concurrency":
+            seconds = float(args[1]) if len(args) > 1 else 2.0
+            cities = int(args[2]) if len(args) > 2 else 2 * 10**5
+            result = WeatherBenchmarks.benchmarkConcurrency(seconds=seconds, cities=cities)
+            print(f"{result['snapshots']} snapshots, {result['recordReadsPerSecond']:,.0f} records read/s "
+                  f"while writing {result['writesPerSecond']:,.0f} changes/s, {len(result['violations'])} violations")
+            print(f"write + snapshot read: {result['writeReadPairSeconds'] * 1e6:.1f} µs")
+            return 0 if not result["violations"] else 1
+        elif name == "suite":
+            return WeatherBenchmarks._suiteMain(args[1:])
+        else:
+            print(f"Unknown benchmark '{name}'.")
+            return 2
+        return 0
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) > 1 and sys.argv[1] == "test":
-        sys.argv.pop()
-        unittest.main()
+        import unittest
+        unittest.main(module="test_main", argv=sys.argv[:1] + sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "serve":
+        import asyncio
+        host = sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1"
+        port = int(sys.argv[3]) if len(sys.argv) > 3 else 8080
+        try:
+            asyncio.run(WeatherServer(WeatherApp(), host, port).serveForever())
+        except KeyboardInterrupt:
+            print("Server stopped.")
+    elif len(sys.argv) > 1 and sys.argv[1] == "batch":
+        if len(sys.argv) > 2 and sys.argv[2] != "-":
+            with open(sys.argv[2], encoding="utf-8") as commands:
+                failures = BatchRunner(WeatherApp()).run(commands)
+        else:
+            failures = BatchRunner(WeatherApp()).run(sys.stdin)
+        sys.exit(1 if failures else 0)
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sys.exit(WeatherBenchmarks.run(sys.argv[2:]))
     else:
         app = WeatherApp()
         app.run()
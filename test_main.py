@@ -0,0 +1,956 @@
+import asyncio
+import concurrent.futures
+import http.client
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest #tests live here so that a plain run of main.py does not have to import unittest
+from unittest import mock
+
+from main import (AlertRule, BaseWeatherAlert, BatchRunner, CityIndexes, CitySearchIndex, CityStore, ContinentAggregates,
+                  ContinentStats, DEFAULT_CITIES, FORECAST_CONDITIONS, ForecastAccumulator, ForecastAnalyzer, NdjsonWeatherFile,
+                  OperationMetrics, WeatherAlertHandler, WeatherApp, WeatherBenchmarks, WeatherData, WeatherJournal,
+                  WeatherServer, WeatherSnapshot, WeatherTable, editDistance)
+
+class WeatherAppTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = WeatherApp()
+        self.app.weatherDataList.clear()
+        self.app.hourlyForecasts.clear()
+
+    def testAddWeatherData(self):
+        self.app.addWeatherData("TestCity", "TestLand", 25, "Sunny", 10, 50)
+        self.assertEqual(len(self.app.weatherDataList), 1)
+        self.assertEqual(self.app.weatherDataList[0].city, "TestCity")
+
+    def testDuplicateCity(self):
+        self.app.addWeatherData("TestCity", "TestLand", 25, "Sunny", 10, 50)
+        self.app.addWeatherData("TestCity", "TestLand", 30, "Cloudy", 12, 60)
+        self.assertEqual(len(self.app.weatherDataList), 1)
+
+    def testGenerateHourlyForecast(self):
+        self.app.addWeatherData("ForecastCity", "Continent", 20, "Cloudy", 10, 60)
+        self.app.generateHourlyForecast("ForecastCity")
+        self.assertIn("forecastcity", self.app.hourlyForecasts)
+        self.assertEqual(len(self.app.hourlyForecasts["forecastcity"]), 24)
+
+    def testWeatherAlerts(self):
+        self.app.addWeatherData("AlertCity", "Continent", 25, "Stormy", 35, 85)
+        alerts = self.app.alert_handler.get_alerts(self.app.weatherDataList[0])
+        self.assertIn("⚠️ Severe weather expected", alerts)
+        self.assertIn("💨 Fast winds warning", alerts)
+        self.assertIn("💧 Very humid", alerts)
+
+    def testForecastAnalyzer(self):
+        forecasts = [
+            WeatherData("X", "C", 15, "Rainy", 10, 60),
+            WeatherData("X", "C", 20, "Rainy", 12, 70),
+            WeatherData("X", "C", 10, "Sunny", 8, 50)
+        ]
+        analyzer = ForecastAnalyzer(forecasts)
+        self.assertEqual(analyzer.getMaxTemperature(), 20)
+        self.assertEqual(analyzer.getMinTemperature(), 10)
+        self.assertEqual(analyzer.getDominantCondition(), "Rainy")
+
+    def testSaveAndLoadData(self):
+        self.app.addWeatherData("SaveCity", "Continent", 22, "Sunny", 15, 55)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "test_save.json")
+            self.app.saveDataToFile(filename)
+
+            new_app = WeatherApp()
+            new_app.weatherDataList.clear()
+            new_app.loadDataFromFile(filename)
+        self.assertTrue(any(d.city == "SaveCity" for d in new_app.weatherDataList))
+
+    def testDeleteCity(self):
+        self.app.addWeatherData("DeleteCity", "Continent", 22, "Sunny", 15, 55)
+        self.assertEqual(len(self.app.weatherDataList), 1)
+        self.app.deleteCity("DeleteCity")
+        self.assertEqual(len(self.app.weatherDataList), 0)
+
+    def testCityLookupIgnoresCase(self):
+        self.app.addWeatherData("Straße", "Europe", 12, "Cloudy", 10, 60)
+        self.app.addWeatherData("STRASSE", "Europe", 14, "Rainy", 12, 70)
+        self.assertEqual(len(self.app.weatherDataList), 1)
+        self.assertIs(self.app.weatherDataList.get("strasse"), self.app.weatherDataList[0])
+        self.app.deleteCity("straße")
+        self.assertIsNone(self.app.weatherDataList.get("Straße"))
+
+    def testListKeepsInsertionOrder(self):
+        for name in ["B", "A", "C"]:
+            self.app.addWeatherData(name, "Continent", 20, "Sunny", 10, 50)
+        self.app.deleteCity("A")
+        self.app.addWeatherData("A", "Continent", 20, "Sunny", 10, 50)
+        self.assertEqual([d.city for d in self.app.weatherDataList], ["B", "C", "A"])
+
+    def testWeatherTableRows(self):
+        records = [
+            WeatherData("X", "C", 15, "Rainy", 35, 60),
+            WeatherData("X", "C", 20.5, "Stormy", 12, 90),
+            WeatherData("X", "C", 10, "Rainy", 8, 50)
+        ]
+        table = WeatherTable.fromRecords(records)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(len(table.continents), 1)
+        self.assertEqual([str(r) for r in table], [str(r) for r in records])
+        analyzer = ForecastAnalyzer(list(table))
+        self.assertEqual(analyzer.getMaxTemperature(), 20.5)
+        self.assertEqual(analyzer.getDominantCondition(), "Rainy")
+        self.assertIn("💨 Fast winds warning", self.app.alert_handler.get_alerts(table[0]))
+        table[-1].condition = "Snowy"
+        self.assertEqual(table.toWeatherData(2).condition, "Snowy")
+
+    def testGenerateAllHourlyForecasts(self):
+        self.app.addWeatherData("Windless", "Continent", 20, "Cloudy", 1, 98)
+        self.app.addWeatherData("Dry", "Continent", -5, "Snowy", 40, 2)
+        matrix = self.app.generateAllHourlyForecasts(seed=7)
+        self.assertEqual(len(matrix), 2)
+        self.assertEqual(len(matrix.table), 48)
+        for key in ("windless", "dry"):
+            forecast = self.app.hourlyForecasts[key]
+            self.assertEqual(len(forecast), 24)
+            for f in forecast:
+                self.assertGreaterEqual(f.windSpeed, 0)
+                self.assertTrue(0 <= f.humidity <= 100)
+                self.assertIn(f.condition, FORECAST_CONDITIONS)
+        self.assertTrue(all(-8 <= f.temperature <= -2 for f in self.app.hourlyForecasts["dry"]))
+        self.assertEqual(self.app.hourlyForecasts["dry"][0].city, "Dry")
+
+        again = self.app.generateAllHourlyForecasts(seed=7)
+        self.assertEqual([str(r) for r in again.table], [str(r) for r in matrix.table])
+        ForecastAnalyzer(self.app.hourlyForecasts["windless"]).getDominantCondition()
+
+    def assertAggregatesMatch(self, app):
+        expected = ContinentAggregates.fromRecords(app.weatherDataList).continents
+        actual = app.continentStats.continents
+        self.assertEqual(sorted(actual), sorted(expected))
+        for cont, stats in expected.items():
+            self.assertEqual(actual[cont].count, stats.count)
+            for field in ContinentStats.FIELDS:
+                self.assertAlmostEqual(actual[cont].sums[field], stats.sums[field])
+                self.assertAlmostEqual(actual[cont].variance(field), stats.variance(field))
+
+    def testContinentAggregatesFollowMutations(self):
+        rng = random.Random(42)
+        store = self.app.weatherDataList
+        continents = ["Asia", "Europe", "Africa"]
+        for step in range(500):
+            city = f"City{rng.randint(0, 40)}"
+            action = rng.random()
+            if action < 0.5:
+                store.add(WeatherData(city, rng.choice(continents), rng.randint(-10, 40), "Sunny",
+                                      rng.randint(0, 50), rng.randint(0, 100)))
+            elif action < 0.8:
+                store.update(city, temperature=rng.randint(-10, 40), humidity=rng.uniform(0, 100),
+                             continent=rng.choice(continents))
+            else:
+                store.delete(city)
+            if step % 50 == 0:
+                self.assertAggregatesMatch(self.app)
+        self.assertAggregatesMatch(self.app)
+        self.app.weatherDataList.clear()
+        self.assertEqual(self.app.continentStats.continents, {})
+
+    def testReportStatsAfterUpdate(self):
+        self.app.addWeatherData("A", "Continent", 10, "Sunny", 10, 50)
+        self.app.addWeatherData("B", "Continent", 20, "Sunny", 30, 70)
+        with mock.patch("builtins.input", side_effect=["30", "", "", ""]):
+            self.app.updateCityInfo("b")
+        stats = self.app.getContinentStats()["Continent"]
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["avg_temperature"], 20)
+        self.assertEqual(stats["stddev_temperature"], 10)
+        self.assertEqual(self.app.weatherDataList.get("B").temperature, 30)
+        self.assertAggregatesMatch(self.app)
+
+    def testEvaluateAllMatchesGetAlerts(self):
+        rng = random.Random(3)
+        for i in range(200):
+            self.app.addWeatherData(f"City{i}", "Continent", 20, rng.choice(FORECAST_CONDITIONS),
+                                    rng.randint(0, 60), rng.randint(0, 100))
+        handler = self.app.alert_handler
+        expected = [(d.city, handler.get_alerts(d)) for d in self.app.weatherDataList]
+        expected = [item for item in expected if item[1]]
+        actual = [(d.city, alerts) for d, alerts in handler.evaluate_all(self.app.weatherDataList)]
+        self.assertEqual(actual, expected)
+        table = WeatherTable.fromRecords(self.app.weatherDataList)
+        from_table = [(d.city, alerts) for d, alerts in handler.evaluate_all(table)]
+        self.assertEqual(from_table, expected)
+
+    def testEvaluateAllWithCustomAlert(self):
+        class FreezingAlert(BaseWeatherAlert):
+            def check_alert(self):
+                return "🥶 Freezing" if self.data.temperature < 0 else None
+
+        handler = WeatherAlertHandler()
+        handler.alert_types.append(FreezingAlert)
+        records = [WeatherData("A", "C", -5, "Snowy", 10, 50), WeatherData("B", "C", 5, "Sunny", 40, 50),
+                   WeatherData("C", "C", 5, "Sunny", 10, 50)]
+        self.assertEqual(list(handler.evaluate_masks(records)), [0b1001, 0b0010, 0])
+        self.assertEqual(list(handler.evaluate_masks(WeatherTable.fromRecords(records))), [0b1001, 0b0010, 0])
+        with mock.patch.object(FreezingAlert, "check_alert", autospec=True, side_effect=FreezingAlert.check_alert) as check:
+            results = handler.evaluate_all(records)
+        self.assertEqual(check.call_count, len(records)) #the messages come from the mask pass, not a second check
+        self.assertEqual([(d.city, a) for d, a in results],
+                         [("A", ["⚠️ Severe weather expected", "🥶 Freezing"]), ("B", ["💨 Fast winds warning"])])
+        with mock.patch.object(AlertRule, "compile", side_effect=AssertionError("compiled again")):
+            self.assertEqual(handler.get_alerts(records[0]), ["⚠️ Severe weather expected", "🥶 Freezing"])
+
+    def testStreamingSaveAndLoad(self):
+        for i in range(25):
+            self.app.addWeatherData(f"Stream{i}", "Continent", i, "Sunny", 10, 50)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "weather.ndjson")
+            self.app.saveDataToFile(filename)
+            self.assertTrue(NdjsonWeatherFile.isNdjson(filename))
+
+            new_app = WeatherApp()
+            new_app.loadDataFromFile(filename, batch_size=4)
+            self.assertEqual([str(d) for d in new_app.weatherDataList], [str(d) for d in self.app.weatherDataList])
+
+            resumed = WeatherApp()
+            offset = resumed.loadDataFromFile(filename, limit=10)
+            self.assertEqual(len(resumed.weatherDataList), 10)
+            resumed.loadDataFromFile(filename, offset=offset, batch_size=3)
+            self.assertEqual([d.city for d in resumed.weatherDataList], [d.city for d in self.app.weatherDataList])
+
+    def testLegacyJsonStillLoads(self):
+        self.app.addWeatherData("Legacy", "Continent", 22, "Sunny", 15, 55)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "weather.json")
+            self.app.saveDataToFile(filename)
+            self.assertFalse(NdjsonWeatherFile.isNdjson(filename))
+            new_app = WeatherApp()
+            new_app.loadDataFromFile(filename)
+            self.assertEqual([d.city for d in new_app.weatherDataList], ["Legacy"])
+
+    def testSnapshotRoundTrip(self):
+        self.app.addWeatherData("Bogotá", "South America", 16.5, "Cloudy", 12, 65)
+        self.app.addWeatherData("Oslo", "Europe", -3, "Snowy", 20, 80)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "weather.snap")
+            self.app.saveSnapshot(filename)
+            with WeatherSnapshot(filename) as snapshot:
+                self.assertEqual(len(snapshot), 2)
+                self.assertEqual(str(snapshot[-1]), str(self.app.weatherDataList.get("oslo")))
+                self.assertEqual(snapshot.city(0), "Bogotá")
+            new_app = WeatherApp()
+            new_app.loadSnapshot(filename)
+            self.assertEqual([str(d) for d in new_app.weatherDataList], [str(d) for d in self.app.weatherDataList])
+            self.assertEqual(new_app.getContinentStats()["Europe"]["avg_temperature"], -3)
+
+    def testSnapshotRejectsCorruption(self):
+        self.app.addWeatherData("Oslo", "Europe", -3, "Snowy", 20, 80)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "weather.snap")
+            self.app.saveSnapshot(filename)
+            with open(filename, "r+b") as f:
+                f.seek(WeatherSnapshot.HEADER_SIZE)
+                f.write(b"\xff")
+            with self.assertRaises(ValueError):
+                WeatherSnapshot(filename)
+            with open(filename, "r+b") as f:
+                f.write(b"NOPE")
+            with self.assertRaises(ValueError):
+                WeatherSnapshot(filename)
+
+    def testParallelForecastsAreDeterministic(self):
+        for i in range(40):
+            self.app.addWeatherData(f"City{i}", "Continent", i - 10, FORECAST_CONDITIONS[i % 5], i % 35, 50 + i)
+        single = self.app.generateAllHourlyForecasts(seed=123, workers=1)
+        parallel = self.app.generateAllHourlyForecasts(seed=123, workers=8, chunk_size=3)
+        for column in ("temperature", "windSpeed", "humidity", "conditionCodes", "continentCodes"):
+            self.assertEqual(getattr(single.table, column).tobytes(), getattr(parallel.table, column).tobytes())
+        self.assertEqual(single.table.cities, parallel.table.cities)
+        self.assertEqual(single.startRows, parallel.startRows)
+        self.assertEqual([str(f) for f in self.app.hourlyForecasts["city7"]], [str(f) for f in single.forCity("city7")])
+
+        self.app.generateHourlyForecast("City7", seed=123)
+        self.assertEqual([str(f) for f in self.app.hourlyForecasts["city7"]], [str(f) for f in single.forCity("city7")])
+
+    def testForecastCacheGeneratesLazilyAndInvalidates(self):
+        self.app.addWeatherData("Lazy", "Continent", 20, "Cloudy", 10, 60)
+        self.assertNotIn("lazy", self.app.hourlyForecasts)
+        forecast = self.app.hourlyForecasts["lazy"]
+        self.assertEqual(len(forecast), 24)
+        self.assertIs(self.app.hourlyForecasts["lazy"], forecast)
+        self.assertEqual(self.app.hourlyForecasts.stats()["misses"], 1)
+        self.assertEqual(self.app.hourlyForecasts.stats()["hits"], 1)
+        self.assertIsNone(self.app.hourlyForecasts.get("nowhere"))
+
+        self.app.weatherDataList.update("Lazy", temperature=-40)
+        self.assertNotIn("lazy", self.app.hourlyForecasts)
+        self.assertTrue(all(f.temperature <= -37 for f in self.app.hourlyForecasts["lazy"]))
+        self.app.deleteCity("Lazy")
+        self.assertNotIn("lazy", self.app.hourlyForecasts)
+
+    def testForecastCacheSurvivesAFailedInsert(self):
+        class Unsized(list):
+            def __len__(self):
+                raise ValueError("no size")
+
+        cache = self.app.hourlyForecasts
+        cache["tokyo"] = [WeatherData("Tokyo", "Asia", 1, "Sunny", 1, 1)]
+        size = cache.currentBytes
+        with self.assertRaises(ValueError):
+            cache["tokyo"] = Unsized()
+        self.assertEqual(len(cache["tokyo"]), 1) #the old forecast is still there and its size still counted
+        self.assertEqual(cache.currentBytes, size)
+        self.assertEqual(len(cache.pop("tokyo")), 1)
+        self.assertEqual(cache.currentBytes, 0)
+
+    def testForecastCacheEvictsLeastRecentlyUsed(self):
+        app = WeatherApp(forecastCacheEntries=3)
+        for name in "ABCD":
+            app.hourlyForecasts[name.lower()] = [WeatherData(name, "C", 1, "Sunny", 1, 1)]
+        self.assertEqual(list(app.hourlyForecasts.keys()), ["b", "c", "d"])
+        self.assertEqual(app.hourlyForecasts.evictions, 1)
+
+        app.hourlyForecasts.clear()
+        app.hourlyForecasts.maxEntries = None
+        app.hourlyForecasts.maxBytes = 2 * 24 * 36
+        for city in ("Tokyo", "Cairo", "Paris"):
+            app.hourlyForecasts[CityStore.cityKey(city)]
+            if city == "Cairo":
+                app.hourlyForecasts["tokyo"] #touch Tokyo so Cairo becomes the oldest
+        self.assertEqual(sorted(app.hourlyForecasts.keys()), ["paris", "tokyo"])
+        self.assertLessEqual(app.hourlyForecasts.currentBytes, app.hourlyForecasts.maxBytes)
+
+        app.bulk_add(WeatherBenchmarks.syntheticRecords(1000))
+        matrix = app.generateAllHourlyForecasts(seed=1)
+        kept = list(app.hourlyForecasts.keys())
+        self.assertEqual(len(kept), 2)
+        for key in kept: #the cached hours no longer reference the 24,000 row matrix
+            self.assertEqual(len(app.hourlyForecasts[key].table), 24)
+            self.assertEqual([str(r) for r in app.hourlyForecasts[key]], [str(r) for r in matrix.forCity(key)])
+
+    def testForecastAnalyzerSinglePassStats(self):
+        temps = [15, 20, 10, 20, 12]
+        forecasts = [WeatherData("X", "C", t, c, 10, 60) for t, c in zip(temps, ["Rainy", "Sunny", "Sunny", "Rainy", "Cloudy"])]
+        analyzer = ForecastAnalyzer(forecasts)
+        self.assertEqual(analyzer.getDominantCondition(), "Rainy")
+        self.assertAlmostEqual(analyzer.getMeanTemperature(), sum(temps) / len(temps))
+        mean = sum(temps) / len(temps)
+        self.assertAlmostEqual(analyzer.getTemperatureStddev(), (sum((t - mean) ** 2 for t in temps) / len(temps)) ** 0.5)
+        self.assertEqual(analyzer.getTemperaturePercentile(50), 15)
+        self.assertEqual(analyzer.getTemperaturePercentile(100), 20)
+        self.assertEqual(analyzer.getTemperaturePercentile(0), 10)
+
+        accumulator = ForecastAccumulator()
+        for f in forecasts:
+            accumulator.addRecord(f)
+        streamed = ForecastAnalyzer.fromAccumulator(accumulator)
+        self.assertEqual(streamed.getMaxTemperature(), 20)
+        self.assertEqual(streamed.getDominantCondition(), "Rainy")
+
+    def testForecastAnalyzerOnLongForecastColumns(self):
+        self.app.addWeatherData("Long", "Continent", 20, "Cloudy", 10, 60)
+        matrix = self.app.generateAllHourlyForecasts(seed=5, hours=14 * 24)
+        forecast = matrix.forCity("long")
+        analyzer = ForecastAnalyzer(forecast)
+        temps = [f.temperature for f in forecast]
+        self.assertEqual(analyzer.getMaxTemperature(), max(temps))
+        self.assertIsInstance(analyzer.getMaxTemperature(), int)
+        self.assertEqual(analyzer.getMinTemperature(), min(temps))
+        means, mins, maxes = analyzer.rollingStats(24)
+        self.assertEqual(len(means), 14 * 24)
+        for end in (0, 23, 100, len(temps) - 1):
+            window = temps[max(0, end - 23):end + 1]
+            self.assertAlmostEqual(means[end], sum(window) / len(window))
+            self.assertEqual(mins[end], min(window))
+            self.assertEqual(maxes[end], max(window))
+
+    def testServerEndpoints(self):
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(WeatherServer(self.app, port=0).start())
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        def request(method, path, body=None):
+            conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+            conn.request(method, path, json.dumps(body) if body is not None else None)
+            response = conn.getresponse()
+            result = response.status, json.loads(response.read())
+            conn.close()
+            return result
+
+        try:
+            status, result = request("POST", "/cities", [
+                {"city": "New York", "continent": "North America", "temperature": 18, "condition": "Stormy",
+                 "windSpeed": 35, "humidity": 55},
+                {"city": "Oslo", "continent": "Europe", "temperature": -3, "condition": "Snowy",
+                 "windSpeed": 10, "humidity": 85},
+                {"city": "oslo", "continent": "Europe", "temperature": 0, "condition": "Snowy",
+                 "windSpeed": 10, "humidity": 85},
+                {"city": "Broken", "continent": "Europe", "temperature": "hot"},
+            ])
+            self.assertEqual(status, 201)
+            self.assertEqual(result["added"], ["New York", "Oslo"])
+            self.assertEqual(result["duplicates"], ["oslo"])
+            self.assertEqual(len(result["errors"]), 1)
+
+            self.assertEqual(request("GET", "/cities")[1]["cities"][0]["city"], "New York")
+            self.assertEqual(request("PATCH", "/cities/new%20york", {"temperature": 20})[1]["temperature"], 20)
+            self.assertEqual(request("GET", "/cities/Nowhere")[0], 404)
+            self.assertEqual(len(request("GET", "/forecast/Oslo")[1]["hours"]), 24)
+            self.assertEqual(sorted(request("POST", "/forecast", {"seed": 1})[1]["forecasts"]), ["new york", "oslo"])
+            self.assertIn("💨 Fast winds warning", request("GET", "/alerts")[1]["alerts"]["New York"])
+            self.assertEqual(request("GET", "/report")[1]["continents"]["Europe"]["count"], 1)
+            self.assertEqual(request("DELETE", "/cities", ["Oslo", "Nowhere"])[1], {"deleted": ["Oslo"], "notFound": ["Nowhere"]})
+            self.assertEqual(request("PUT", "/report")[0], 405)
+            self.assertEqual(request("POST", "/forecast", [1, 2])[0], 400)
+            self.assertEqual(request("POST", "/forecast", {"hours": -3})[0], 400)
+            self.assertEqual(request("POST", "/forecast", {"hours": 10**9})[0], 400)
+            self.assertEqual(list(request("POST", "/forecast", {"hours": 48})[1]["forecasts"]), ["new york"])
+            self.assertEqual(len(request("GET", "/forecast/New%20York")[1]["hours"]), 24) #the 48-hour run didn't replace it
+
+            def raw(data): #status line of the reply to bytes that http.client wouldn't send
+                with socket.create_connection(("127.0.0.1", server.port), timeout=10) as sock:
+                    sock.sendall(data)
+                    return sock.makefile("rb").readline().decode("latin-1").strip()
+
+            self.assertEqual(raw(b"garbage\r\n\r\n"), "HTTP/1.1 400 Bad Request")
+            self.assertEqual(raw(b"GET /cities HTTP/1.1\r\nContent-Length: nope\r\n\r\n"), "HTTP/1.1 400 Bad Request")
+            self.assertEqual(raw(b"POST /cities HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (server.maxBodyBytes + 1)),
+                             "HTTP/1.1 413 Payload Too Large")
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+                bodies = [{"city": f"Client{i}", "continent": "Asia", "temperature": i, "condition": "Sunny",
+                           "windSpeed": 5, "humidity": 50} for i in range(40)]
+                statuses = list(pool.map(lambda body: request("POST", "/cities", body)[0], bodies))
+            self.assertEqual(statuses, [201] * 40)
+            self.assertEqual(self.app.getContinentStats()["Asia"]["count"], 40)
+        finally:
+            asyncio.run_coroutine_threadsafe(server.close(), loop).result(10)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(10)
+            loop.close()
+
+    def testBenchmarkSuiteReport(self):
+        report = WeatherBenchmarks.runSuite(sizes=[200], samples=20, trackMemory=True)
+        operations = report["results"]["200"]
+        for name in ("addWeatherData", "generateHourlyForecast", "generateReport", "get_alerts",
+                     "ForecastAnalyzer", "saveDataToFile", "loadDataFromFile"):
+            self.assertIn(name, operations)
+            self.assertGreater(operations[name]["throughput"], 0)
+            self.assertIn("peakBytes", operations[name])
+        self.assertEqual(operations["addWeatherData"]["calls"], 200)
+        json.dumps(report)
+
+        slower = json.loads(json.dumps(report))
+        slower["results"]["200"]["generateReport"]["throughput"] /= 10
+        self.assertEqual(WeatherBenchmarks.compareResults(report, report), [])
+        self.assertEqual(len(WeatherBenchmarks.compareResults(slower, report)), 1)
+
+    def testOperationMetrics(self):
+        self.app.metrics = OperationMetrics()
+        self.app.addWeatherData("A", "Continent", 10, "Sunny", 10, 50)
+        self.app.addWeatherData("B", "Continent", 20, "Stormy", 40, 90)
+        with mock.patch("builtins.input", side_effect=["30", "", "", ""]):
+            self.app.updateCityInfo("B")
+        self.app.generateReport()
+        self.assertEqual(self.app.showWeatherAlerts("B"), self.app.alert_handler.get_alerts(self.app.weatherDataList.get("B")))
+        self.assertIsNone(self.app.showWeatherAlerts("Nowhere"))
+        self.assertEqual(len(self.app.generateHourlyForecast("A")), 24)
+        self.assertIsNone(self.app.generateHourlyForecast("Nowhere"))
+        self.app.generateAllHourlyForecasts(seed=1)
+        self.app.deleteCity("A")
+        ops = self.app.metrics.operations
+        self.assertEqual(ops["add"]["calls"], 2)
+        self.assertEqual(ops["report"]["records"], 2)
+        self.assertEqual((ops["alerts"]["calls"], ops["alerts"]["records"]), (2, 1))
+        self.assertEqual((ops["forecast"]["calls"], ops["forecast"]["records"]), (2, 24)) #nothing counted for the miss
+        self.assertEqual(ops["forecast_all"]["records"], 48)
+        self.assertEqual(ops["delete"]["calls"], 1)
+        self.assertEqual(sum(ops["add"]["buckets"]), 2)
+
+        text = self.app.metrics.prometheusText()
+        self.assertIn('weatherapp_operation_calls_total{operation="add"} 2', text)
+        self.assertIn('weatherapp_operation_duration_seconds_bucket{operation="add",le="+Inf"} 2', text)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "metrics.prom")
+            self.app.metrics.writePrometheus(filename)
+            with open(filename) as f:
+                self.assertEqual(f.read(), text)
+
+    def testOperationMetricsProfileHook(self):
+        profiled = []
+        self.app.metrics = OperationMetrics(profileHook=lambda name, profile: profiled.append(name))
+        self.app.addWeatherData("A", "Continent", 10, "Sunny", 10, 50)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "weather.json")
+            self.app.saveDataToFile(filename)
+            self.app.loadDataFromFile(filename)
+        self.assertEqual(profiled, ["add", "save", "load"])
+        self.assertEqual(self.app.metrics.operations["bulk_add"]["calls"], 1)
+        self.assertEqual(self.app.metrics.operations["load"]["records"], 1)
+
+    def testOperationMetricsCountProcessedRecords(self):
+        self.app.metrics = OperationMetrics()
+        for i in range(10):
+            self.app.addWeatherData(f"City{i}", "Continent", i, "Sunny", 10, 50)
+        self.app.addWeatherData("City0", "Continent", 0, "Sunny", 10, 50) #duplicate, nothing added
+        self.app.deleteCity("Nowhere")
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "weather.ndjson")
+            self.app.saveDataToFile(filename)
+            offset = self.app.loadDataFromFile(filename, limit=4)
+            self.app.loadDataFromFile(filename, offset=offset, limit=3) #resumed, the store now has 7
+        ops = self.app.metrics.operations
+        self.assertEqual((ops["add"]["calls"], ops["add"]["records"]), (11, 10))
+        self.assertEqual((ops["delete"]["calls"], ops["delete"]["records"]), (1, 0))
+        self.assertEqual((ops["load"]["calls"], ops["load"]["records"]), (2, 7))
+
+    def testBulkAddReportsDuplicatesAndErrors(self):
+        result = self.app.bulk_add([
+            ("A", "Continent", 10, "Sunny", 10, 50),
+            {"city": "B", "continent": "Continent", "temperature": "12.5", "condition": "Rainy",
+             "windSpeed": "3", "humidity": 70},
+            WeatherData("a", "Continent", 11, "Sunny", 10, 50),
+            ("C", "Continent", "warm", "Sunny", 10, 50),
+            {"city": "D"},
+            ("", "Continent", 1, "Sunny", 1, 1),
+        ], batch_size=2)
+        self.assertEqual(result.added, 2)
+        self.assertEqual(result.duplicates, [(2, "a")])
+        self.assertEqual([i for i, _ in result.errors], [3, 4, 5])
+        self.assertEqual(self.app.weatherDataList.get("b").temperature, 12.5)
+        self.assertEqual(self.app.weatherDataList.get("b").windSpeed, 3)
+        self.assertEqual(self.app.getContinentStats()["Continent"]["count"], 2)
+
+    def testImportCsvAndTsv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_file = os.path.join(tmp, "obs.csv")
+            with open(csv_file, "w", encoding="utf-8") as f:
+                f.write("humidity,city,continent,temperature,condition,wind_speed\n")
+                f.write("65,Bogotá,South America,16,Cloudy,12\n")
+                f.write("80,Oslo,Europe,-3,Snowy,20\n")
+                f.write("80,Broken,Europe,,Snowy,20\n")
+                f.write("short,row\n")
+            result = self.app.importCsv(csv_file)
+            self.assertEqual(result.added, 2)
+            self.assertEqual(len(result.errors), 2)
+            self.assertEqual(str(self.app.weatherDataList.get("oslo")), "Oslo (Europe) - -3°C, Snowy, Wind: 20 km/h, Humidity: 80%")
+
+            tsv_file = os.path.join(tmp, "obs.tsv")
+            with open(tsv_file, "w", encoding="utf-8") as f:
+                f.write("city\tcontinent\ttemperature\tcondition\twindSpeed\thumidity\n")
+                f.write("Oslo\tEurope\t1\tSnowy\t20\t80\n")
+                f.write("Lima\tSouth America\t22\tCloudy\t10\t50\n")
+            result = self.app.importCsv(tsv_file)
+            self.assertEqual((result.added, result.duplicates), (1, [(0, "Oslo")]))
+
+            wide_file = os.path.join(tmp, "wide.csv")
+            with open(wide_file, "w", encoding="utf-8") as f:
+                f.write("id,station,city,continent,temperature,condition,windSpeed,humidity\n")
+                f.write("1,S1,Quito,South America,14,Rainy,8,80\n")
+                f.write("\n")
+                f.write("X,Europe,9,Sunny,10,50\n") #6 cells, but the header has 8 columns
+            result = self.app.importCsv(wide_file)
+            self.assertEqual(result.added, 1)
+            self.assertEqual(result.errors, [(1, "Expected 8 columns, got 6")]) #the blank line is skipped, not an error
+            self.assertIsNone(self.app.weatherDataList.get("X"))
+
+    def testJournalReplaysChanges(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, "weather.ndjson")
+            self.app.addWeatherData("Kept", "Continent", 10, "Sunny", 10, 50)
+            self.app.addWeatherData("Gone", "Continent", 10, "Sunny", 10, 50)
+            self.app.saveDataToFile(base)
+
+            self.app.enableJournal(base, batchSize=2, compactThreshold=1000)
+            self.app.weatherDataList.update("Kept", temperature=25)
+            self.app.deleteCity("Gone")
+            self.app.addWeatherData("New", "Continent", 5, "Rainy", 5, 90)
+            self.assertEqual(self.app.journal.pendingCount, 1)
+            self.app.saveChanges()
+            self.assertEqual(self.app.journal.entries, 3)
+            self.app.disableJournal()
+            with open(base + ".journal", "a") as f:
+                f.write('{"op": "delete", "ci') #a torn write from a crash
+            self.app.enableJournal(base)
+            self.app.addWeatherData("AfterCrash", "Continent", 1, "Sunny", 1, 1)
+            self.app.disableJournal()
+
+            restored = WeatherApp()
+            restored.weatherDataList.clear()
+            restored.enableJournal(base)
+            self.assertEqual([str(d) for d in restored.weatherDataList], [str(d) for d in self.app.weatherDataList])
+            restored.disableJournal()
+
+    def testJournalSaveWhileWriting(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, "weather.ndjson")
+            self.app.enableJournal(base, batchSize=7, compactThreshold=10**9)
+
+            def writer():
+                for i in range(3000):
+                    self.app.weatherDataList.add(WeatherData(f"City{i}", "Continent", i, "Sunny", 10, 50))
+
+            thread = threading.Thread(target=writer)
+            with mock.patch("builtins.print"):
+                thread.start()
+                while thread.is_alive():
+                    self.app.saveChanges()
+                thread.join()
+                self.app.disableJournal()
+            self.assertEqual(WeatherJournal.countEntries(base + ".journal"), 3000) #no entry lost between a flush and its swap
+
+            restored = WeatherApp()
+            restored.weatherDataList.clear()
+            restored.enableJournal(base)
+            self.assertEqual(len(restored.weatherDataList), 3000)
+            restored.disableJournal()
+
+    def testJournalCompaction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, "weather.ndjson")
+            self.app.enableJournal(base, batchSize=5, compactThreshold=20)
+            for i in range(60):
+                self.app.addWeatherData(f"City{i}", "Continent", i, "Sunny", 10, 50)
+                if i % 3 == 0:
+                    self.app.weatherDataList.update(f"City{i}", humidity=90)
+            self.app.saveChanges()
+            self.app.waitForCompaction()
+            self.assertTrue(os.path.exists(base))
+            self.assertLess(WeatherJournal.countEntries(base + ".journal"), 20)
+            self.assertFalse(os.path.exists(base + ".journal.compacting"))
+            self.app.disableJournal()
+
+            restored = WeatherApp()
+            restored.weatherDataList.clear()
+            restored.enableJournal(base)
+            self.assertEqual([str(d) for d in restored.weatherDataList], [str(d) for d in self.app.weatherDataList])
+            restored.disableJournal()
+
+    def testJournalRecoversUnfinishedCompaction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, "weather.ndjson")
+            self.app.enableJournal(base, batchSize=1, compactThreshold=1000)
+            self.app.addWeatherData("BeforeCrash", "Continent", 1, "Sunny", 1, 1)
+            self.app.disableJournal()
+            os.replace(base + ".journal", base + ".journal.compacting") #crashed after rotating, before the new base
+
+            restored = WeatherApp()
+            restored.weatherDataList.clear()
+            restored.enableJournal(base, batchSize=1, compactThreshold=5)
+            self.assertIsNotNone(restored.weatherDataList.get("BeforeCrash"))
+            self.assertFalse(os.path.exists(base + ".journal.compacting"))
+            self.assertEqual(WeatherJournal.countEntries(base + ".journal"), 0) #folded into the new base
+            for i in range(30):
+                restored.addWeatherData(f"City{i}", "Continent", i, "Sunny", 10, 50)
+            restored.waitForCompaction()
+            self.assertLess(WeatherJournal.countEntries(base + ".journal"), 5) #compaction runs again
+            self.assertFalse(os.path.exists(base + ".journal.compacting"))
+            restored.disableJournal()
+
+            again = WeatherApp()
+            again.weatherDataList.clear()
+            again.enableJournal(base)
+            self.assertEqual([str(d) for d in again.weatherDataList], [str(d) for d in restored.weatherDataList])
+            again.disableJournal()
+
+    def testDefaultCitiesAreSharedCopyOnWrite(self):
+        first = WeatherApp()
+        second = WeatherApp()
+        self.assertEqual(len(first.weatherDataList), len(DEFAULT_CITIES))
+        self.assertIs(first.weatherDataList.get("Tokyo"), second.weatherDataList.get("tokyo"))
+        with self.assertRaises(AttributeError):
+            first.weatherDataList.get("Tokyo").temperature = 99
+
+        first.weatherDataList.update("Tokyo", temperature=99)
+        first.deleteCity("Cairo")
+        self.assertEqual(first.weatherDataList.get("Tokyo").temperature, 99)
+        self.assertEqual(second.weatherDataList.get("Tokyo").temperature, 22)
+        self.assertIsNotNone(second.weatherDataList.get("Cairo"))
+        self.assertEqual(second.getContinentStats()["Africa"]["count"],
+                         first.getContinentStats()["Africa"]["count"] + 1)
+        self.assertEqual(len(WeatherApp(defaultCities=False).weatherDataList), 0)
+
+    def testLoadDefaultCitiesTwice(self):
+        app = WeatherApp()
+        stats = app.getContinentStats()
+        app.weatherDataList.update("Tokyo", temperature=99)
+        app.loadDefaultCities()
+        self.assertEqual(len(app.weatherDataList), len(DEFAULT_CITIES))
+        self.assertEqual(len(list(app.weatherDataList)), len(DEFAULT_CITIES))
+        self.assertEqual(app.getContinentStats()["Asia"]["count"], stats["Asia"]["count"])
+        self.assertEqual(app.weatherDataList.get("Tokyo").temperature, 99) #an existing city is not reset
+        app.deleteCity("Tokyo")
+        self.assertNotIn("Tokyo", [data.city for data in app.weatherDataList])
+        app.weatherDataList.clear()
+        app.loadDefaultCities()
+        self.assertEqual(len(list(app.weatherDataList)), len(DEFAULT_CITIES))
+
+    def testStartupSkipsHeavyImports(self): #the time budget itself is checked by "bench startup"
+        output = subprocess.run([sys.executable, "-c", "import sys, main; main.WeatherApp(); print(sorted({'unittest', "
+                                 "'asyncio', 'concurrent.futures'} & set(sys.modules)))"],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "[]")
+
+    def testSortedIndexesMatchNaiveQueries(self):
+        rng = random.Random(11)
+        store = self.app.weatherDataList
+        continents = ["Asia", "Europe", "Africa"]
+        for i in range(150):
+            self.app.addWeatherData(f"City{i}", rng.choice(continents), rng.randint(-10, 40), "Sunny",
+                                    rng.randint(0, 60), rng.randint(0, 100))
+        self.app.topCities("temperature") #builds the indexes, the rest of the changes go through the observer
+        for step in range(300):
+            city = f"City{rng.randint(0, 200)}"
+            action = rng.random()
+            if action < 0.4:
+                store.add(WeatherData(city, rng.choice(continents), rng.randint(-10, 40), "Sunny",
+                                      rng.randint(0, 60), rng.randint(0, 100)))
+            elif action < 0.8:
+                store.update(city, windSpeed=rng.randint(0, 60), continent=rng.choice(continents))
+            else:
+                store.delete(city)
+
+        for field in CityIndexes.FIELDS:
+            for continent in continents + [None]:
+                cities = [d for d in store if continent is None or d.continent == continent]
+                values = sorted((getattr(d, field) for d in cities), reverse=True)
+                self.assertEqual([getattr(d, field) for d in self.app.topCities(field, 10, continent)], values[:10])
+                self.assertEqual([getattr(d, field) for d in self.app.topCities(field, 5, continent, largest=False)],
+                                 sorted(values)[:5])
+                expected = {d.city for d in cities if 20 <= getattr(d, field) <= 40}
+                self.assertEqual({d.city for d in self.app.citiesInRange(field, 20, 40, continent)}, expected)
+        self.assertEqual(len(self.app.topPercent("humidity", 1)), -(-len(store) // 100))
+        self.assertEqual(self.app.topCities("humidity", 3, "Atlantis"), [])
+        with self.assertRaises(ValueError):
+            self.app.topCities("condition")
+
+        indexes = self.app._indexes
+        store.clear() #a reload drops the indexes, the next query builds them with one sort
+        for i in range(50):
+            store.add(WeatherData(f"Reloaded{i}", "Europe", i, "Sunny", 10, 50))
+        self.assertEqual(len(indexes.all["temperature"]), 0)
+        self.assertEqual([d.temperature for d in self.app.topCities("temperature", 3)], [49, 48, 47])
+        self.assertIsNot(self.app._indexes, indexes)
+        self.assertNotIn(indexes, store.observers)
+        store.update("Reloaded0", temperature=100)
+        self.assertEqual(self.app.topCities("temperature", 1)[0].city, "Reloaded0")
+
+    def testObservationHistoryRingAndRollups(self):
+        clock = [0.0]
+        history = self.app.enableHistory(capacity=10, hourlyCapacity=5, dailyCapacity=3, clock=lambda: clock[0])
+        self.app.addWeatherData("Trend", "Continent", 0, "Sunny", 10, 50)
+        for minute in range(1, 60 * 30): #30 hours, one update per minute
+            clock[0] = minute * 60.0
+            self.app.weatherDataList.update("Trend", temperature=minute % 60, condition="Rainy" if minute % 2 else "Sunny")
+
+        trend = history.get("trend")
+        self.assertEqual(len(trend), 10)
+        self.assertEqual(len(trend.hourly), 5)
+        self.assertLessEqual(len(trend.daily), 3)
+        last_hour = trend.hourly[-1]
+        self.assertEqual(last_hour.count, 60)
+        self.assertEqual((last_hour.min("temperature"), last_hour.max("temperature")), (0, 59))
+        self.assertAlmostEqual(last_hour.mean("temperature"), 29.5)
+        self.assertEqual(sum(day.count for day in trend.rollups("daily")), 60 * 30 - 10)
+        self.assertEqual(trend.hourly.starts.typecode, "d") #rollups are ring columns, not an object per hour
+        self.assertEqual([h.start for h in trend.hourly], [trend.hourly[0].start + n * 3600 for n in range(5)]) #ring order
+        with self.assertRaises(IndexError):
+            trend.hourly[5]
+
+        window = self.app.cityHistory("Trend", start=clock[0] - 4 * 60)
+        self.assertEqual(list(window.timestamps), [clock[0] - m * 60 for m in range(4, -1, -1)])
+        self.assertEqual(len(self.app.cityHistory("Trend")), 10)
+        analyzer = window.analyzer()
+        self.assertEqual(analyzer.getMaxTemperature(), max(window.temperature))
+        self.assertIn(analyzer.getDominantCondition(), ("Rainy", "Sunny"))
+
+        clock[0] -= 3600 #the clock steps back an hour, the observation is kept at the latest time seen
+        self.app.weatherDataList.update("Trend", temperature=99)
+        self.assertEqual(list(trend.query().timestamps), sorted(trend.query().timestamps))
+        self.assertEqual(list(self.app.cityHistory("Trend", start=clock[0] + 3600).temperature), [59, 99])
+
+        self.app.deleteCity("Trend")
+        self.assertIsNone(self.app.cityHistory("Trend"))
+
+    def testCitySearchFoldingPrefixAndFuzzy(self):
+        app = WeatherApp()
+        self.assertEqual(app.findCity("sao paulo").city, "São Paulo")
+        self.assertEqual(app.findCity("  BOGOTA ").city, "Bogotá")
+        self.assertEqual([d.city for d in app.searchCities("me", 2)], ["Medellín", "Melbourne"])
+        self.assertEqual(app.searchCities("Sydny", 1)[0].city, "Sydney")
+        self.assertEqual(app.searchCities("Reykjavík", 1)[0].city, "Reykjavik")
+
+        app.addWeatherData("Medina", "Asia", 40, "Sunny", 5, 10)
+        self.assertIn("Medina", [d.city for d in app.searchCities("medi")])
+        app.deleteCity("medellin")
+        self.assertIsNone(app.weatherDataList.get("Medellín"))
+        self.assertEqual([d.city for d in app.searchCities("medi")], ["Medina"])
+
+        app.addWeatherData("Bogota", "South America", 15, "Rainy", 10, 70)
+        self.assertEqual(app.findCity("BOGOTA").city, "Bogota") #exact match wins
+        app.weatherDataList.delete("Bogota")
+        with mock.patch("builtins.input", side_effect=["", "", "", "90"]):
+            app.updateCityInfo("bogota")
+        self.assertEqual(app.weatherDataList.get("Bogotá").humidity, 90)
+
+    def testFuzzySearchDistanceLimits(self):
+        index = self.app._searchIndex()
+        self.app.addWeatherData("São Paulo", "South America", 25, "Rainy", 8, 80)
+        self.assertEqual(index.fuzzy("sao paulo", maxDistance=0), [("são paulo", 0)])
+        self.assertEqual(index.fuzzy("sao paolo", maxDistance=0), [])
+        self.assertEqual(index.fuzzy("sao paolo", maxDistance=1), [("são paulo", 1)])
+        self.app.weatherDataList.clear()
+        self.assertEqual(index.fuzzy("sao paulo"), [])
+        self.assertEqual(index.prefix("s"), [])
+
+    def testSearchIndexIsRebuiltLazily(self):
+        app = WeatherApp()
+        index = app._searchIndex()
+        self.assertIsNone(app.findCity("Sidney"))
+        self.assertFalse(index.fuzzyReady) #a miss only needs the folded names, not the trigrams
+        with mock.patch("builtins.print") as printed, mock.patch.object(CitySearchIndex, "SUGGEST_BUILD_LIMIT", 10):
+            app.showHourlyForecast("Sidney")
+        self.assertNotIn("Did you mean", str(printed.call_args_list)) #too many names to build them for a typo
+        self.assertFalse(index.fuzzyReady)
+        with mock.patch("builtins.print") as printed:
+            app.showHourlyForecast("Sidney")
+        self.assertIn("Did you mean: Sydney?", str(printed.call_args_list))
+        self.assertTrue(index.fuzzyReady)
+
+        app.weatherDataList.clear() #a reload drops the index, the next lookup builds a new one in one go
+        app.addWeatherData("São Paulo", "South America", 25, "Rainy", 8, 80)
+        self.assertEqual(len(index._folded), 0)
+        self.assertEqual(app.findCity("sao paulo").city, "São Paulo")
+        self.assertIsNot(app._searchIndex(), index)
+        self.assertNotIn(index, app.weatherDataList.observers)
+        self.assertEqual(app.searchCities("sao paolo")[0].city, "São Paulo")
+
+    def testEditDistance(self):
+        self.assertEqual(editDistance("kitten", "sitting"), 3)
+        self.assertEqual(editDistance("", "abc"), 3)
+        self.assertEqual(editDistance("abcdef", "a", limit=2), 3)
+
+    def testConcurrentReadersSeeWholeSnapshots(self):
+        result = WeatherBenchmarks.benchmarkConcurrency(readers=4, writers=4, seconds=1.0, cities=10**5)
+        self.assertEqual(result["violations"], [])
+        self.assertGreater(result["snapshots"], 0)
+        self.assertGreater(result["writes"], 0)
+        app = result["app"]
+        self.assertAggregatesMatch(app) #no observer update lost between writers
+        self.assertEqual(sum(stats.count for stats in app.continentStats.continents.values()), len(app.weatherDataList))
+
+    def testSnapshotIsImmutableAndShared(self):
+        store = self.app.weatherDataList
+        self.app.addWeatherData("Oslo", "Europe", 5, "Cloudy", 10, 80)
+        snapshot = store.snapshot()
+        self.assertIs(store.snapshot(), snapshot) #nothing changed, no new copy
+        store.update("Oslo", temperature=-5)
+        store.delete("Oslo")
+        self.app.addWeatherData("Bergen", "Europe", 8, "Rainy", 20, 90)
+        self.assertEqual([d.city for d in snapshot], ["Oslo"])
+        self.assertEqual(snapshot.get("oslo").temperature, 5)
+        self.assertEqual([d.city for d in store], ["Bergen"])
+        self.assertGreater(store.snapshot().version, snapshot.version)
+
+    def testSnapshotsMatchTheStoreAtTheirTime(self):
+        with mock.patch.object(CityStore, "CHUNK", 4): #small chunks so copies, holes and compaction all happen
+            store = CityStore()
+            rng = random.Random(5)
+            model = {} #key -> record, insertion ordered like the store
+            taken = []
+            for step in range(2000):
+                city = f"City {rng.randrange(60)}"
+                roll = rng.random()
+                if roll < 0.4:
+                    data = WeatherData(city, "Europe", step, "Sunny", 1, 1)
+                    if store.add(data):
+                        model[city.casefold()] = data
+                elif roll < 0.7:
+                    if store.update(city, temperature=step):
+                        model[city.casefold()] = store.get(city)
+                elif roll < 0.9:
+                    if store.delete(city):
+                        del model[city.casefold()]
+                else:
+                    taken.append((store.snapshot(), list(model.values())))
+            for snapshot, expected in taken:
+                self.assertEqual(list(snapshot), expected)
+                self.assertEqual(len(snapshot), len(expected))
+            self.assertEqual(list(store), list(model.values()))
+
+    def testSnapshotSharesUntouchedChunks(self):
+        store = CityStore()
+        store.seed([WeatherData(f"City {i}", "Europe", 1, "Sunny", 1, 1) for i in range(CityStore.CHUNK * 3)])
+        before = store.snapshot()
+        store.update(f"City {CityStore.CHUNK * 2}", temperature=9)
+        after = store.snapshot()
+        #a write copies only the chunk it touched, the next snapshot reuses the other ones
+        self.assertIs(after._chunks[0], before._chunks[0])
+        self.assertIs(after._chunks[1], before._chunks[1])
+        self.assertIsNot(after._chunks[2], before._chunks[2])
+        self.assertEqual(before.get(f"City {CityStore.CHUNK * 2}").temperature, 1)
+
+    def testBatchRunnerGroupsCommandsAndReportsPerLine(self):
+        app = WeatherApp(metrics=OperationMetrics())
+        out = io.StringIO()
+        lines = [
+            "# setup",
+            "add Oslo Europe 5 Cloudy 10 80",
+            '{"op": "add", "city": "Bergen", "continent": "Europe", "temperature": 8, "condition": "Rainy", "windSpeed": 20, "humidity": 90}',
+            "add Oslo Europe 5 Cloudy 10 80",
+            "update oslo temperature=-3 humidity=95",
+            "get sao paulo",
+            "forecast all seed=3",
+            "alerts all",
+            "delete Bergen",
+            "get Bergen",
+            "launch rockets",
+        ]
+        with mock.patch.object(app, "generateAllHourlyForecasts", wraps=app.generateAllHourlyForecasts) as forecastAll, \
+                mock.patch.object(out, "write", wraps=out.write) as write:
+            failures = BatchRunner(app, out).run(lines)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertEqual(failures, 3)
+        self.assertEqual([r["line"] for r in results], list(range(2, 12)))
+        self.assertEqual([r["ok"] for r in results], [True, True, False, True, True, True, True, True, False, False])
+        self.assertIn("already exists", results[2]["error"])
+        self.assertEqual((results[3]["temperature"], results[3]["humidity"]), (-3, 95))
+        self.assertEqual(results[4]["city"], "São Paulo")
+        self.assertIn("Oslo", results[5]["forecasts"])
+        self.assertEqual(results[6]["alerts"]["Bergen"], app.alert_handler.get_alerts(WeatherData("Bergen", "Europe", 8, "Rainy", 20, 90)))
+        self.assertEqual(app.metrics.operations["bulk_add"]["calls"], 1) #the three adds went in together
+        forecastAll.assert_called_once()
+        self.assertEqual(write.call_count, 1) #one buffered write, not a print per line
+
+    def testBatchRunnerReportsUnexpectedErrors(self):
+        app = WeatherApp()
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            listFile = os.path.join(tmp, "list.json")
+            with open(listFile, "w") as f:
+                json.dump([{"city": "Oslo"}], f)
+            with mock.patch.object(app.alert_handler, "evaluate_all", side_effect=KeyError("boom")):
+                failures = BatchRunner(app, out).run([f"load {listFile}", "alerts all", "get Tokyo"])
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(failures, 2)
+        self.assertEqual([r["ok"] for r in results], [False, False, True])
+        self.assertIn("not a weather data file", results[0]["error"])
+        self.assertEqual(results[1]["error"], "KeyError: 'boom'")
+        self.assertEqual(len(app.weatherDataList), len(DEFAULT_CITIES)) #the bad file didn't clear the store
+
+        out = io.StringIO()
+        with mock.patch.object(app, "bulk_add", side_effect=MemoryError), self.assertRaises(MemoryError):
+            BatchRunner(app, out).run(["get Tokyo", "add Oslo Europe 5 Cloudy 10 80"])
+        self.assertEqual(json.loads(out.getvalue())["city"], "Tokyo") #lines before the failure are still written
+
+    def testWeatherTableUsesLessMemory(self):
+        result = WeatherBenchmarks.benchmarkMemory(2000)
+        self.assertLess(result["tableBytes"], result["objectBytes"])
+
+if __name__ == "__main__":
+    unittest.main()